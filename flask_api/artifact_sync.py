@@ -0,0 +1,341 @@
+"""
+Sync the ticker artifacts from the model bucket
+
+Usage:
+python3 artifact_sync.py --bucket finsight-ml-model
+python3 artifact_sync.py --bucket finsight-ml-model --tickers BBCA.JK BBRI.JK
+python3 artifact_sync.py --store-dir ../stock_model --prefix ""      # local fake object store
+
+The bucket holds stock_model/<ticker>/{model_saham.h5, model_saham.npz,
+scaler.pkl, data_saham.csv}. The notebooks' "model_saham 1Dec.h5", as in
+the repository's stock_model/, is synced as model_saham.h5 when a ticker
+has no model_saham.h5. Blobs are listed once, and only blobs whose
+generation or MD5 changed since the last sync are downloaded, in parallel
+over one shared client. Downloads land in a content-addressed cache
+(<cache_dir>/objects/<md5>), so an interrupted sync resumes from its partial
+files. Files under models/, scalers/ and csv/ are then swapped in with
+os.replace, so the registry only ever reads a complete file.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from process_lock import ProcessLock
+
+Blob = namedtuple("Blob", ["name", "generation", "md5", "size"])
+
+# File name in the bucket -> local directory, as read by ModelRegistry.paths
+TARGETS = {
+    "model_saham.h5": "models",
+    "model_saham.npz": "models",
+    "model_saham.float16.tflite": "models",
+    "model_saham.int8.tflite": "models",
+    "variants.json": "models",
+    "scaler.pkl": "scalers",
+    "data_saham.csv": "csv",
+}
+
+# Names the notebooks saved models under -> file name in TARGETS, used when the ticker has no such file
+LEGACY_NAMES = {
+    "model_saham 1Dec.h5": "model_saham.h5",
+}
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def gcs_client(credentials="credential.json"):
+    """Get the process-wide GCS client, created on first use"""
+    from google.cloud import storage
+
+    # Keyed on the pid too, a forked worker never shares the master's connections
+    key = (os.getpid(), credentials)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if credentials and os.path.exists(credentials):
+                client = storage.Client.from_service_account_json(credentials)
+            else:
+                # Default credentials, e.g. the service account of the instance
+                client = storage.Client()
+            _clients[key] = client
+        return client
+
+
+class GCSObjectStore:
+    def __init__(self, bucket_name, credentials="credential.json"):
+        """
+        Google Cloud Storage bucket
+
+        Parameters:
+        bucket_name (str): Name of the GCS bucket
+        credentials (str): Service account JSON, the default credentials when missing
+        """
+        self.bucket_name = bucket_name
+        self.credentials = credentials
+
+    @property
+    def bucket(self):
+        return gcs_client(self.credentials).bucket(self.bucket_name)
+
+    def list(self, prefix):
+        for blob in self.bucket.list_blobs(prefix=prefix):
+            # Composite objects have no MD5, their generation still identifies the content
+            md5 = base64.b64decode(blob.md5_hash).hex() if blob.md5_hash else None
+            yield Blob(blob.name, blob.generation, md5, blob.size)
+
+    def download(self, blob, f, start=0):
+        """Write the blob's bytes from start on to f, pinned to the listed generation"""
+        self.bucket.blob(blob.name, generation=blob.generation).download_to_file(f, start=start or None)
+
+
+class LocalObjectStore:
+    def __init__(self, root):
+        """
+        Directory served like a bucket, for offline runs and tests
+
+        Object names are paths relative to root, the generation is the
+        modification time in nanoseconds.
+        """
+        self.root = root
+
+    def list(self, prefix):
+        base = os.path.join(self.root, prefix)
+        for directory, _, files in os.walk(base if os.path.isdir(base) else os.path.dirname(base)):
+            for file in sorted(files):
+                path = os.path.join(directory, file)
+                name = os.path.relpath(path, self.root).replace(os.sep, "/")
+                if name.startswith(prefix):
+                    stat = os.stat(path)
+                    yield Blob(name, stat.st_mtime_ns, _md5_file(path), stat.st_size)
+
+    def download(self, blob, f, start=0):
+        with open(os.path.join(self.root, blob.name), "rb") as source:
+            source.seek(start)
+            shutil.copyfileobj(source, f)
+
+
+class ArtifactSync:
+    def __init__(self, store, base_dir=".", cache_dir=".artifacts", prefix="stock_model/", max_workers=8):
+        """
+        Incremental, parallel download of the ticker artifacts
+
+        Parameters:
+        store: GCSObjectStore, LocalObjectStore or any object with list(prefix) and download(blob, f, start)
+        base_dir (str): Directory containing models/, scalers/ and csv/
+        cache_dir (str): Directory of the content-addressed cache and its index
+        prefix (str): Prefix of the ticker directories in the store
+        max_workers (int): Number of parallel downloads
+        """
+        self.store = store
+        self.base_dir = base_dir
+        self.cache_dir = cache_dir
+        self.prefix = prefix
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self.last_report = None
+
+        os.makedirs(os.path.join(cache_dir, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "partial"), exist_ok=True)
+
+    def plan(self, tickers=None):
+        """
+        List the store and map every artifact blob to its local path
+
+        Returns:
+        list: (blob, local path) pairs
+        """
+        wanted = set(tickers) if tickers else None
+        planned, legacy = {}, {}
+        for blob in self.store.list(self.prefix):
+            parts = blob.name[len(self.prefix):].split("/")
+            if len(parts) != 2 or (parts[1] not in TARGETS and parts[1] not in LEGACY_NAMES):
+                continue
+            ticker, file = parts
+            if wanted is not None and ticker not in wanted:
+                continue
+            if file in LEGACY_NAMES:
+                legacy[(ticker, LEGACY_NAMES[file])] = blob
+            else:
+                planned[(ticker, file)] = blob
+
+        # A file under its current name wins over its legacy name
+        for key, blob in legacy.items():
+            planned.setdefault(key, blob)
+        return [
+            (blob, os.path.join(self.base_dir, TARGETS[file], ticker, file))
+            for (ticker, file), blob in planned.items()
+        ]
+
+    def sync(self, tickers=None):
+        """
+        Bring the local artifacts up to date with the store
+
+        Returns:
+        dict: Counts of downloaded, reused and unchanged files, bytes downloaded, failures and duration
+        """
+        start = time.perf_counter()
+        with self._lock, ProcessLock(os.path.join(self.cache_dir, "lock")) as acquired:
+            if not acquired:
+                # Another process of this replica is already syncing the same directories
+                return {"skipped": True}
+
+            index = self._read_index()
+            planned = self.plan(tickers)
+
+            # Blobs whose generation is already known keep their recorded MD5, even without one in the listing
+            resolved = []
+            for blob, path in planned:
+                known = index["blobs"].get(blob.name)
+                if blob.md5 is None and known and known["generation"] == blob.generation:
+                    blob = blob._replace(md5=known["md5"])
+                resolved.append((blob, path))
+
+            missing = {blob.name: blob for blob, _ in resolved if not self._cached(blob)}
+            failed = {}
+            downloaded_bytes = 0
+            if missing:
+                pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="artifact-sync")
+                try:
+                    futures = {name: pool.submit(self._fetch, blob) for name, blob in missing.items()}
+                    for name, future in futures.items():
+                        try:
+                            md5, size = future.result()
+                            missing[name] = missing[name]._replace(md5=md5)
+                            downloaded_bytes += size
+                        except Exception as e:
+                            failed[name] = str(e)
+                finally:
+                    pool.shutdown(wait=True)
+
+            report = {"downloaded": 0, "reused": 0, "unchanged": 0, "bytes": downloaded_bytes,
+                      "failed": failed}
+            for blob, path in resolved:
+                if blob.name in failed:
+                    continue
+                blob = missing.get(blob.name, blob)
+                index["blobs"][blob.name] = {"generation": blob.generation, "md5": blob.md5}
+
+                if index["targets"].get(path) == blob.md5 and os.path.exists(path):
+                    report["unchanged"] += 1
+                    continue
+                self._install(blob.md5, path)
+                index["targets"][path] = blob.md5
+                report["downloaded" if blob.name in missing else "reused"] += 1
+
+            self._write_index(index)
+            report["seconds"] = round(time.perf_counter() - start, 3)
+            self.last_report = report
+            return report
+
+    def start(self, interval, tickers=None):
+        """Sync every interval seconds in a background thread, once, the first sync is left to the caller"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(interval, tickers),
+                    name="artifact-sync", daemon=True)
+                self._thread.start()
+
+    def _run(self, interval, tickers):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sync(tickers)
+            except Exception as e:
+                # The artifacts already on disk keep being served
+                print(f"Artifact sync failed: {e}")
+
+    def _object_path(self, md5):
+        return os.path.join(self.cache_dir, "objects", md5[:2], md5)
+
+    def _cached(self, blob):
+        return blob.md5 is not None and os.path.exists(self._object_path(blob.md5))
+
+    def _fetch(self, blob):
+        """Download a blob into the cache, resuming a previous partial download of the same generation"""
+        key = hashlib.sha1(f"{blob.name}@{blob.generation}".encode()).hexdigest()
+        partial = os.path.join(self.cache_dir, "partial", key)
+
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        if blob.size is None or offset < blob.size:
+            with open(partial, "ab") as f:
+                self.store.download(blob, f, start=offset)
+
+        md5 = _md5_file(partial)
+        if blob.md5 is not None and md5 != blob.md5:
+            # A corrupt or stale partial file is never resumed again
+            os.remove(partial)
+            raise ValueError(f"MD5 mismatch for {blob.name}")
+
+        path = self._object_path(md5)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(partial) - offset
+        os.replace(partial, path)
+        return md5, size
+
+    def _install(self, md5, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(self._object_path(md5), tmp_path)
+        os.replace(tmp_path, path)
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, "index.json")
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"blobs": {}, "targets": {}}
+
+    def _write_index(self, index):
+        tmp_path = f"{self._index_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path())
+
+
+def _md5_file(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the ticker artifacts from the model bucket")
+    parser.add_argument("--bucket", help="Name of the GCS bucket")
+    parser.add_argument("--store-dir", help="Directory used as a local fake object store instead of GCS")
+    parser.add_argument("--credentials", default="credential.json", help="Service account JSON")
+    parser.add_argument("--prefix", default="stock_model/", help="Prefix of the ticker directories")
+    parser.add_argument("--tickers", nargs="*", help="Tickers to sync, all by default")
+    parser.add_argument("--base-dir", default=".", help="Directory containing models/, scalers/ and csv/")
+    parser.add_argument("--cache-dir", default=".artifacts", help="Directory of the content-addressed cache")
+    parser.add_argument("--workers", type=int, default=8, help="Number of parallel downloads")
+    args = parser.parse_args()
+
+    if args.store_dir:
+        store = LocalObjectStore(args.store_dir)
+    elif args.bucket:
+        store = GCSObjectStore(args.bucket, args.credentials)
+    else:
+        parser.error("--bucket or --store-dir is required")
+
+    syncer = ArtifactSync(store, base_dir=args.base_dir, cache_dir=args.cache_dir, prefix=args.prefix,
+        max_workers=args.workers)
+    print(json.dumps(syncer.sync(args.tickers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _Batch:
+    def __init__(self):
+        self.requests = []
+        self.closed = False
+
+
+class MicroBatcher:
+    def __init__(self, max_batch_size=32, max_wait=0.005):
+        """
+        Coalesces concurrent rollouts of the same model into one batched rollout
+
+        The first request for a model opens a batch and waits up to max_wait
+        seconds, or until max_batch_size requests joined, then runs a single
+        rollout for all of them and hands every request its own slice.
+        Identical windows share a row.
+
+        Parameters:
+        max_batch_size (int): Maximum number of requests in one batch
+        max_wait (float): Seconds the first request waits for others to join
+        """
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._open = {}
+        self._cond = threading.Condition()
+        self.batches = 0
+        self.requests = 0
+
+    def forecast(self, engine, window, n_steps, run=None):
+        """
+        Forecast n_steps values following a window, batched with concurrent calls
+
+        Parameters:
+        engine (RolloutEngine): Engine of the model, batches are per engine
+        window (np.ndarray): Last window_size values of the series
+        n_steps (int): Number of future values to predict
+        run (callable): Runs engine.rollout, e.g. on an inference pool, called directly by default
+
+        Returns:
+        np.ndarray: The n_steps predicted values
+        """
+        future = Future()
+        request = (np.asarray(window, dtype=np.float32), n_steps, future)
+        key = id(engine)
+
+        with self._cond:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._open[key] = batch
+            batch.requests.append(request)
+            if len(batch.requests) >= self.max_batch_size:
+                self._close(key, batch)
+
+        if leader:
+            self._lead(key, batch, engine, run or (lambda fn, *args: fn(*args)))
+
+        return future.result()
+
+    def _close(self, key, batch):
+        batch.closed = True
+        if self._open.get(key) is batch:
+            del self._open[key]
+        self._cond.notify_all()
+
+    def _lead(self, key, batch, engine, run):
+        deadline = time.monotonic() + self.max_wait
+        with self._cond:
+            while not batch.closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._close(key, batch)
+                    break
+                self._cond.wait(remaining)
+            requests = list(batch.requests)
+            self.batches += 1
+            self.requests += len(requests)
+
+        try:
+            # Identical windows, e.g. the same ticker requested twice, share one row
+            rows, row_of = [], []
+            seen = {}
+            for window, _, _ in requests:
+                signature = (window.shape, window.tobytes())
+                if signature not in seen:
+                    seen[signature] = len(rows)
+                    rows.append(window)
+                row_of.append(seen[signature])
+
+            n_steps = max(request[1] for request in requests)
+            predictions, _ = run(engine.rollout, np.stack(rows), n_steps)
+
+            for (_, steps, future), row in zip(requests, row_of):
+                future.set_result(predictions[row, :steps])
+        except BaseException as e:
+            for _, _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
@@ -0,0 +1,242 @@
+"""
+Benchmarks of the forecasting and clustering hot paths
+
+Usage:
+python3 benchmark.py --output bench.json
+python3 benchmark.py --output bench.json --baseline baseline.json --tolerance 0.2
+python3 benchmark.py --save-baseline baseline.json
+
+Everything runs offline: forecasting uses the bundled models/, scalers/ and
+csv/, clustering uses synthetic random-walk prices on mixed calendars and
+history lengths, as in the production universe. With --baseline, the
+exit code is 1 when any benchmark's median is slower than the baseline by
+more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class SyntheticSource:
+    def __init__(self, n_tickers, days=730, seed=42):
+        """
+        In-memory random-walk market data, same interface as market_data.YahooFinanceSource
+
+        Parameters:
+        n_tickers (int): Number of tickers in the universe
+        days (int): Number of business days of history
+        seed (int): Seed of the random walks
+        """
+        rng = np.random.default_rng(seed)
+        self.tickers = [f"SYN{i:04d}" for i in range(n_tickers)]
+        self.data = {}
+
+        for i, ticker in enumerate(self.tickers):
+            dates = self._calendar(i, days, rng)
+            drift, volatility = rng.normal(0.0003, 0.0005), rng.uniform(0.005, 0.04)
+            close = 100 * np.exp(np.cumsum(rng.normal(drift, volatility, len(dates))))
+            self.data[ticker] = pd.DataFrame({
+                "Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                "Volume": rng.integers(1e5, 1e7, len(dates)).astype(float),
+            }, index=dates)
+
+        self.infos = {
+            ticker: {"forwardPE": rng.uniform(5, 40), "dividendYield": rng.uniform(0, 0.06),
+                     "marketCap": rng.uniform(1e9, 1e12), "beta": rng.uniform(0.3, 2)}
+            for ticker in self.tickers
+        }
+
+    @staticmethod
+    def _calendar(i, days, rng):
+        """
+        Trading days of the i-th ticker, mixing calendars like the production universe
+
+        IDX and US stocks trade on business days in their own time zone, FX every
+        day, futures skip some sessions, and a quarter of the tickers listed later.
+        """
+        end = pd.Timestamp("2024-12-31")
+        kind = i % 4
+        if kind == 0:
+            dates = pd.bdate_range(end=end, periods=days, tz="Asia/Jakarta")
+        elif kind == 1:
+            dates = pd.bdate_range(end=end, periods=days, tz="America/New_York")
+        elif kind == 2:
+            dates = pd.date_range(end=end, periods=days * 7 // 5, freq="D", tz="Europe/London")
+        else:
+            dates = pd.bdate_range(end=end, periods=days, tz="America/Chicago")
+            dates = dates[rng.random(len(dates)) > 0.05]
+        if i % 5 == 4:
+            # Listed later than the others
+            dates = dates[int(rng.integers(len(dates) // 4, len(dates) // 2)):]
+        return dates
+
+    def history(self, tickers, start, end):
+        return {ticker: self.ticker_history(ticker, start, end) for ticker in tickers}
+
+    def ticker_history(self, ticker, start, end):
+        return self.data[ticker].loc[start:end]
+
+    def info(self, ticker):
+        return self.infos[ticker]
+
+
+def measure(fn, repeat=5, warmup=1):
+    """Time fn, returning the median, min and max in seconds"""
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "max": max(timings),
+        "repeat": repeat,
+    }
+
+
+def bench_forecasting(results, tickers, horizons, repeat):
+    import tensorflow as tf
+    import joblib
+
+    from model_registry import ModelRegistry
+    from utils import extended_forecast, get_window, parse_data_from_file, read_price_csv
+
+    registry = ModelRegistry(base_dir=BASE_DIR)
+
+    for stock in tickers:
+        paths = registry.paths(stock)
+
+        results[f"model_load[{stock}]"] = measure(
+            lambda: tf.keras.models.load_model(paths["model"]), repeat=repeat, warmup=0)
+        results[f"scaler_load[{stock}]"] = measure(lambda: joblib.load(paths["scaler"]), repeat=repeat)
+        results[f"read_price_csv[{stock}]"] = measure(lambda: read_price_csv(paths["csv"]), repeat=repeat)
+        results[f"parse_data_from_file[{stock}]"] = measure(
+            lambda: parse_data_from_file(paths["csv"]), repeat=repeat)
+
+        entry = registry.get(stock)
+        window_size = get_window(stock)
+        for years in horizons:
+            results[f"extended_forecast[{stock},{years}y]"] = measure(
+                lambda: extended_forecast(entry.model, entry.series, window_size, forecast_steps=years),
+                repeat=repeat)
+
+
+def bench_predict_handler(results, tickers, horizons, repeat):
+    import index
+
+    client = index.app.test_client()
+
+    def post(stock, years, cached):
+        if not cached:
+            index.forecast_cache.clear()
+        response = client.post("/predict", json={"stock": stock, "steps": years})
+        assert response.status_code == 200, response.get_json()
+
+    for stock in tickers:
+        for years in horizons:
+            results[f"predict_handler[{stock},{years}y]"] = measure(
+                lambda: post(stock, years, cached=False), repeat=repeat)
+            results[f"predict_handler_cached[{stock},{years}y]"] = measure(
+                lambda: post(stock, years, cached=True), repeat=repeat)
+
+
+def bench_clustering(results, sizes, repeat):
+    from recommendation_k_means import StockClusteringSystem
+
+    for size in sizes:
+        source = SyntheticSource(size)
+
+        def run():
+            system = StockClusteringSystem(source.tickers, "2023-01-01", "2025-01-01", data_source=source)
+            system.fetch_data()
+            system.create_feature_matrix()
+            system.preprocess_features()
+            system.perform_clustering(n_clusters=3)
+
+        results[f"clustering_pipeline[{size}]"] = measure(run, repeat=repeat)
+
+
+def compare(results, baseline, tolerance):
+    """Get the benchmarks whose median regressed by more than tolerance"""
+    regressions = {}
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            continue
+        ratio = result["median"] / reference["median"]
+        if ratio > 1 + tolerance:
+            regressions[name] = {"baseline": reference["median"], "current": result["median"], "ratio": ratio}
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the forecasting and clustering hot paths")
+    parser.add_argument("--output", default="bench.json", help="Machine-readable results file")
+    parser.add_argument("--baseline", help="Results file to check for regressions against")
+    parser.add_argument("--save-baseline", help="Also write the results to this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, 0.2 means 20%%")
+    parser.add_argument("--tickers", nargs="*", default=["BBCA.JK", "^GSPC"], help="Tickers to forecast")
+    parser.add_argument("--horizons", nargs="*", type=int, default=[1, 5, 10], help="Horizons in years")
+    parser.add_argument("--universe", nargs="*", type=int, default=[18, 100, 500],
+        help="Universe sizes of the clustering benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark")
+    parser.add_argument("--skip", nargs="*", default=[], choices=["forecasting", "predict", "clustering"])
+    args = parser.parse_args()
+
+    # The service reads its artifacts relative to its own directory
+    os.chdir(BASE_DIR)
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault("PRICE_STORE_DIR", tempfile.mkdtemp(prefix="bench-store-"))
+
+    results = {}
+    if "forecasting" not in args.skip:
+        bench_forecasting(results, args.tickers, args.horizons, args.repeat)
+    if "predict" not in args.skip:
+        bench_predict_handler(results, args.tickers, args.horizons, args.repeat)
+    if "clustering" not in args.skip:
+        bench_clustering(results, args.universe, args.repeat)
+
+    report = {
+        "meta": {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    for name, result in results.items():
+        print(f"{name:60s} {result['median'] * 1000:10.2f} ms")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, regression in regressions.items():
+            print(f"REGRESSION {name}: {regression['baseline'] * 1000:.2f} ms -> "
+                  f"{regression['current'] * 1000:.2f} ms ({regression['ratio']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Overloaded(Exception):
+    def __init__(self, name, retry_after):
+        """
+        Raised when a pool or limiter is at capacity
+
+        Parameters:
+        name (str): Name of the saturated pool
+        retry_after (int): Seconds the client should wait before retrying
+        """
+        super().__init__(f"{name} is at capacity, retry later")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Limiter:
+    def __init__(self, name, capacity, retry_after=1):
+        """
+        Non-blocking admission control
+
+        Parameters:
+        name (str): Name reported in errors
+        capacity (int): Maximum number of concurrent holders
+        retry_after (int): Retry-After sent when at capacity
+        """
+        self.name = name
+        self.capacity = capacity
+        self.retry_after = retry_after
+        self._semaphore = threading.BoundedSemaphore(capacity)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+
+    def acquire(self):
+        if not self._semaphore.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise Overloaded(self.name, self.retry_after)
+        with self._lock:
+            self.in_flight += 1
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._semaphore.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class BoundedExecutor:
+    def __init__(self, name, max_workers, max_queue=0, retry_after=1):
+        """
+        Thread pool with a bounded queue, rejecting work instead of queueing it forever
+
+        Parameters:
+        name (str): Name of the pool, also the prefix of its threads
+        max_workers (int): Number of threads
+        max_queue (int): Number of tasks allowed to wait for a thread
+        retry_after (int): Retry-After sent when the queue is full
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._limiter = Limiter(name, max_workers + max_queue, retry_after)
+
+    @property
+    def in_flight(self):
+        return self._limiter.in_flight
+
+    @property
+    def rejected(self):
+        return self._limiter.rejected
+
+    def submit(self, fn, *args, **kwargs):
+        """Submit fn, raising Overloaded when both the threads and the queue are taken"""
+        self._limiter.acquire()
+        try:
+            # The task runs in a copy of the caller's context, e.g. the profiler of its request
+            future = self._pool.submit(_run_in_context, contextvars.copy_context(), fn, args, kwargs)
+        except BaseException:
+            self._limiter.release()
+            raise
+        future.add_done_callback(lambda _: self._limiter.release())
+        return future
+
+    def run(self, fn, *args, **kwargs):
+        """Run fn on the pool and wait for its result"""
+        return self.submit(fn, *args, **kwargs).result()
+
+
+def _run_in_context(context, fn, args, kwargs):
+    # Published on the thread so a sampling profiler can tell which request a worker is serving
+    thread = threading.current_thread()
+    thread.task_context = context
+    try:
+        return context.run(fn, *args, **kwargs)
+    finally:
+        thread.task_context = None
@@ -0,0 +1,163 @@
+"""
+Export the Keras window models to the pure-NumPy runtime
+
+Usage:
+python3 export_numpy.py                  # every ticker of get_window
+python3 export_numpy.py --tickers BBCA.JK --weeks 260
+
+Each models/<ticker>/model_saham.h5 is written as models/<ticker>/model_saham.npz
+and checked against Keras: single predictions on random windows and a
+recursive rollout from the ticker's own series must agree within the tolerance.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import tensorflow as tf
+
+from model_registry import ModelRegistry
+from numpy_runtime import NumpyModel
+from utils import get_tickers, get_window
+
+
+def _lstm_config(lstm):
+    config = lstm.get_config()
+    return {
+        "activation": config["activation"],
+        "recurrent_activation": config["recurrent_activation"],
+        "return_sequences": config["return_sequences"],
+    }
+
+
+def _lstm_weights(prefix, lstm, weights):
+    cell = lstm.cell
+    weights[f"{prefix}/kernel"] = cell.kernel.numpy()
+    weights[f"{prefix}/recurrent_kernel"] = cell.recurrent_kernel.numpy()
+    weights[f"{prefix}/bias"] = cell.bias.numpy() if cell.use_bias else np.zeros(cell.kernel.shape[1])
+
+
+def _lambda_factor(layer):
+    """Get the factor of a Lambda computing x * factor, by probing it"""
+    ones = tf.ones((2, 1))
+    factor = float(layer(ones).numpy().ravel()[0])
+    if not (np.allclose(layer(ones * 3.0).numpy(), 3.0 * factor) and np.allclose(layer(ones * 0.0).numpy(), 0.0)):
+        raise ValueError(f"Lambda layer {layer.name} is not a constant scaling")
+    return factor
+
+
+def export(model):
+    """
+    Convert a Keras Sequential window model
+
+    Returns:
+    tuple: (layers, weights) as expected by numpy_runtime.NumpyModel
+    """
+    layers, weights = [], {}
+
+    for layer in model.layers:
+        kind = type(layer).__name__
+        name = layer.name
+
+        if kind == "InputLayer":
+            continue
+        if kind == "Conv1D":
+            config = layer.get_config()
+            layers.append({
+                "type": "Conv1D", "name": name, "activation": config["activation"],
+                "padding": config["padding"], "dilation_rate": int(config["dilation_rate"][0]),
+            })
+            if int(config["strides"][0]) != 1:
+                raise ValueError(f"Unsupported Conv1D strides in {name}")
+            weights[f"{name}/kernel"] = layer.kernel.numpy()
+            weights[f"{name}/bias"] = layer.bias.numpy() if layer.use_bias else np.zeros(config["filters"])
+        elif kind == "Bidirectional":
+            layers.append({
+                "type": "Bidirectional", "name": name, "merge_mode": layer.merge_mode,
+                "forward": _lstm_config(layer.forward_layer), "backward": _lstm_config(layer.backward_layer),
+            })
+            _lstm_weights(f"{name}/forward", layer.forward_layer, weights)
+            _lstm_weights(f"{name}/backward", layer.backward_layer, weights)
+        elif kind == "LSTM":
+            layers.append({"type": "LSTM", "name": name, **_lstm_config(layer)})
+            _lstm_weights(name, layer, weights)
+        elif kind == "Dense":
+            config = layer.get_config()
+            layers.append({"type": "Dense", "name": name, "activation": config["activation"]})
+            weights[f"{name}/kernel"] = layer.kernel.numpy()
+            weights[f"{name}/bias"] = layer.bias.numpy() if layer.use_bias else np.zeros(config["units"])
+        elif kind == "Lambda":
+            layers.append({"type": "Scale", "name": name, "factor": _lambda_factor(layer)})
+        else:
+            raise ValueError(f"Unsupported layer {kind} ({name})")
+
+    return layers, weights
+
+
+def save(path, layers, weights):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, config=np.array(json.dumps(layers)), **weights)
+    os.replace(tmp_path, path)
+
+
+def check(model, numpy_model, series, window_size, weeks, seed=0):
+    """
+    Compare the NumPy runtime with Keras
+
+    Returns:
+    dict: Maximum absolute difference of single predictions and of a recursive rollout
+    """
+    from inference import RolloutEngine
+
+    rng = np.random.default_rng(seed)
+    windows = rng.uniform(0, 1, (16, window_size)).astype(np.float32)
+    single = np.max(np.abs(model(windows[:, :, np.newaxis], training=False).numpy() - numpy_model(windows)))
+
+    keras_rollout = RolloutEngine(model).forecast(series, window_size, weeks)
+    numpy_rollout = numpy_model.forecast(series, window_size, weeks)
+
+    return {
+        "single": float(single),
+        "rollout": float(np.max(np.abs(keras_rollout - numpy_rollout))),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Keras window models to the NumPy runtime")
+    parser.add_argument("--tickers", nargs="*", help="Tickers to export, all by default")
+    parser.add_argument("--base-dir", default=".", help="Directory containing models/, scalers/ and csv/")
+    parser.add_argument("--weeks", type=int, default=52, help="Length of the rollout compared with Keras")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="Maximum absolute difference")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(base_dir=args.base_dir)
+    failed = []
+
+    for stock in args.tickers or get_tickers():
+        try:
+            entry = registry.get(stock)
+        except OSError as e:
+            print(f"Skipping {stock}: {e}")
+            continue
+
+        layers, weights = export(entry.model)
+        numpy_model = NumpyModel(layers, weights)
+        diff = check(entry.model, numpy_model, entry.series, get_window(stock), args.weeks)
+
+        if max(diff.values()) > args.tolerance:
+            failed.append(stock)
+            print(f"{stock}: parity FAILED {diff}, not exported")
+            continue
+
+        path = os.path.join(os.path.dirname(registry.paths(stock)["model"]), "model_saham.npz")
+        save(path, layers, weights)
+        print(f"{stock}: exported to {path}, parity {diff}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
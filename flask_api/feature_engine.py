@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+
+RETURN_FEATURES = ['daily_return_mean', 'daily_return_std', 'monthly_return_mean', 'yearly_return_mean']
+TECHNICAL_FEATURES = ['rsi_mean', 'macd_diff_mean', 'ma50_ma200_ratio']
+
+
+def align_prices(data, column='Close'):
+    """
+    Align the prices of every ticker into wide matrices
+
+    Parameters:
+    data (dict): DataFrame of bars per ticker, as in StockClusteringSystem.data
+    column (str): Price column to use
+
+    Returns:
+    tuple: (by_date, by_position) DataFrames with one column per ticker. by_date is
+    indexed by the union of all trading days, by_position stacks each ticker's own
+    bars from row 0 so that rolling and exponential windows never see another
+    exchange's holidays.
+    """
+    series = {}
+    for ticker, df in data.items():
+        s = df[column].astype(float)
+        if getattr(s.index, 'tz', None) is not None:
+            # Keep each exchange's wall time so bars stay in their own month and year
+            s = s.tz_localize(None)
+        series[ticker] = s
+
+    by_date = pd.DataFrame(series)
+    # Positional Series are aligned on their RangeIndex, shorter columns are padded with NaN at the end
+    by_position = pd.concat({ticker: pd.Series(s.to_numpy()) for ticker, s in series.items()}, axis=1) \
+        if series else pd.DataFrame()
+    by_position = by_position.reindex(columns=list(series))
+    return by_date, by_position
+
+
+def _period_returns(by_date, freq):
+    """Returns of each ticker's last price per period, like Series.resample(freq).last().pct_change()"""
+    last = by_date.resample(freq).last()
+    # Only fill the gaps inside each ticker's own range, as pct_change does on a single ticker
+    inside = last.ffill().notna() & last.bfill().notna()
+    filled = last.ffill().where(inside)
+    return filled / filled.shift(1) - 1
+
+
+def _ema(frame, min_periods, span=None, alpha=None):
+    return frame.ewm(span=span, alpha=alpha, min_periods=min_periods, adjust=False).mean()
+
+
+def compute_features(data, column='Close'):
+    """
+    Compute the return and technical features of every ticker in one pass
+
+    Matches calculate_returns and calculate_technical_indicators of
+    StockClusteringSystem, including ta's RSI (window 14) and MACD
+    (12, 26, 9) definitions, without a Python loop over tickers.
+
+    Returns:
+    pd.DataFrame: One row per ticker, columns RETURN_FEATURES + TECHNICAL_FEATURES
+    """
+    by_date, prices = align_prices(data, column)
+    tickers = list(prices.columns)
+    lengths = np.array([len(data[ticker]) for ticker in tickers], dtype=int)
+    valid = pd.DataFrame(np.arange(len(prices))[:, None] < lengths[None, :], columns=tickers)
+
+    # Returns
+    daily_returns = (prices / prices.shift(1) - 1).where(valid)
+    monthly_returns = _period_returns(by_date, 'M')
+    yearly_returns = _period_returns(by_date, 'Y')
+
+    # RSI, as ta.momentum.RSIIndicator
+    diff = prices.diff(1)
+    up = diff.where(diff > 0, 0.0)
+    down = -diff.where(diff < 0, 0.0)
+    ema_up = _ema(up, 14, alpha=1 / 14)
+    ema_down = _ema(down, 14, alpha=1 / 14)
+    rsi = pd.DataFrame(
+        np.where(ema_down == 0, 100, 100 - (100 / (1 + ema_up / ema_down))),
+        columns=tickers
+    ).where(valid)
+
+    # MACD diff, as ta.trend.MACD
+    macd = _ema(prices, 12, span=12) - _ema(prices, 26, span=26)
+    macd_diff = (macd - _ema(macd, 9, span=9)).where(valid)
+
+    # Moving averages, ratio taken at each ticker's last bar
+    last_row = np.maximum(lengths - 1, 0)
+    columns = np.arange(len(tickers))
+    ma50 = prices.rolling(window=50).mean().to_numpy()[last_row, columns] if len(prices) else np.full(len(tickers), np.nan)
+    ma200 = prices.rolling(window=200).mean().to_numpy()[last_row, columns] if len(prices) else np.full(len(tickers), np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(lengths > 0, ma50 / ma200, 0)
+
+    features = pd.DataFrame({
+        'daily_return_mean': daily_returns.mean(),
+        'daily_return_std': daily_returns.std(),
+        'monthly_return_mean': monthly_returns.mean(),
+        'yearly_return_mean': yearly_returns.mean(),
+        'rsi_mean': rsi.mean(),
+        'macd_diff_mean': macd_diff.mean(),
+        'ma50_ma200_ratio': pd.Series(ratio, index=tickers),
+    })
+    features.index.name = 'ticker'
+    return features
+
+
+def compare_with_reference(system, rtol=1e-9, atol=1e-12):
+    """
+    Compare compute_features with the per-ticker methods of a StockClusteringSystem
+
+    Returns:
+    pd.DataFrame: Absolute difference per ticker and feature, only where they do not match
+    """
+    vectorized = compute_features(system.data)
+    reference = pd.DataFrame([
+        {'ticker': ticker, **system.calculate_returns(ticker), **system.calculate_technical_indicators(ticker)}
+        for ticker in system.tickers
+    ]).set_index('ticker')[vectorized.columns]
+
+    a = vectorized.loc[reference.index].to_numpy(dtype=float)
+    b = reference.to_numpy(dtype=float)
+    mismatch = ~np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+    diff = pd.DataFrame(np.abs(a - b), index=reference.index, columns=reference.columns)
+    return diff.where(mismatch).dropna(how='all').dropna(axis=1, how='all')
@@ -0,0 +1,139 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class ForecastCache:
+    def __init__(self, max_size=256, ttl=3600, cache_dir=None):
+        """
+        TTL + LRU cache of forecasted prices, with an optional on-disk tier
+
+        Only the longest forecast of a (ticker, data version) pair is kept,
+        shorter horizons are served as its prefix since the rollout is
+        deterministic.
+
+        Parameters:
+        max_size (int): Maximum number of (ticker, version) pairs kept in memory
+        ttl (float): Seconds an entry stays valid, None to never expire
+        cache_dir (str): Directory of the on-disk tier, None to disable it
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    def get(self, stock, version, n_weeks):
+        """
+        Get the first n_weeks forecasted prices and times
+
+        Returns:
+        tuple: (prices, times) arrays, or None when not cached
+        """
+        # A slice of zero or fewer weeks would count from the end of the forecast
+        if n_weeks <= 0:
+            return None
+        key = (stock, version)
+        now = time.time()
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and self._expired(cached[0], now):
+                del self._entries[key]
+                cached = None
+            if cached is not None and len(cached[1]) >= n_weeks:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1][:n_weeks], cached[2][:n_weeks]
+
+        cached = self._read_disk(stock, version, now)
+        if cached is not None and len(cached[1]) >= n_weeks:
+            self._store(key, cached)
+            with self._lock:
+                self.disk_hits += 1
+            return cached[1][:n_weeks], cached[2][:n_weeks]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, stock, version, prices, times):
+        """Cache a forecast, unless a longer one of the same version is already cached"""
+        key = (stock, version)
+        cached = (time.time(), np.asarray(prices), np.asarray(times, dtype="datetime64[ns]"))
+
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and len(current[1]) >= len(cached[1]) \
+                    and not self._expired(current[0], cached[0]):
+                return
+
+        self._store(key, cached)
+        self._write_disk(stock, version, cached)
+
+    def clear(self):
+        """Drop every in-memory entry, the on-disk tier is kept"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Get the cache counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _expired(self, created, now):
+        return self.ttl is not None and now - created > self.ttl
+
+    def _store(self, key, cached):
+        with self._lock:
+            self._entries[key] = cached
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _path(self, stock, version):
+        return os.path.join(self.cache_dir, f"{stock}-{version}.npz")
+
+    def _read_disk(self, stock, version, now):
+        if not self.cache_dir:
+            return None
+
+        path = self._path(stock, version)
+        try:
+            with np.load(path) as data:
+                cached = (float(data["created"]), data["prices"], data["times"])
+        except (OSError, KeyError, ValueError):
+            return None
+
+        if self._expired(cached[0], now):
+            return None
+        return cached
+
+    def _write_disk(self, stock, version, cached):
+        if not self.cache_dir:
+            return
+
+        # Write to a temporary file first so readers never see a partial file
+        path = self._path(stock, version)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, created=cached[0], prices=cached[1], times=cached[2])
+        os.replace(tmp_path, path)
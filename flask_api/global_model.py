@@ -0,0 +1,265 @@
+"""
+One forecasting model shared by every ticker
+
+The global model reads a window left-padded to the longest window of
+get_window, a mask marking the ticker's own window_size values in it, and
+the ticker's id, looked up in an embedding. It is trained by
+train_global.py on the same data_saham.csv files and stored as
+
+models/global/model_global.h5      Keras model
+models/global/model_global.json    Tickers (embedding ids), their window sizes and the padded length
+
+Serving it (GLOBAL_MODEL_DIR=models/global) keeps one model in memory
+whatever the number of tickers, and a batch of tickers is one rollout.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+MODEL_FILE = "model_global.h5"
+META_FILE = "model_global.json"
+
+
+def build_model(n_tickers, max_window, embedding_dim=8, filters=64, units=64):
+    """
+    Define the uncompiled global model
+
+    Same stack as the per-ticker models (causal Conv1D, two bidirectional
+    LSTMs, Dense) with a mask channel and the ticker embedding repeated
+    along the window as extra input features.
+
+    Parameters:
+    n_tickers (int): Size of the ticker vocabulary
+    max_window (int): Padded window length, the largest window size
+    embedding_dim (int): Size of the ticker embedding
+
+    Returns:
+    tf.keras.Model: Model mapping [values, mask, ticker] to one scaled value per row
+    """
+    import tensorflow as tf
+
+    values = tf.keras.Input(shape=(max_window,), name="values")
+    mask = tf.keras.Input(shape=(max_window,), name="mask")
+    ticker = tf.keras.Input(shape=(1,), dtype="int32", name="ticker")
+
+    # Padded values are zeroed, the mask channel tells them apart from real zeros
+    masked = tf.keras.layers.Multiply()([values, mask])
+    series = tf.keras.layers.Concatenate()([
+        tf.keras.layers.Reshape((max_window, 1))(masked),
+        tf.keras.layers.Reshape((max_window, 1))(mask),
+    ])
+    embedding = tf.keras.layers.Embedding(n_tickers, embedding_dim, name="ticker_embedding")(ticker)
+    embedding = tf.keras.layers.Flatten()(embedding)
+    x = tf.keras.layers.Concatenate()([series, tf.keras.layers.RepeatVector(max_window)(embedding)])
+
+    x = tf.keras.layers.Conv1D(filters=filters, kernel_size=3, activation="relu", padding="causal")(x)
+    x = tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(units=units, return_sequences=True))(x)
+    x = tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(units=units))(x)
+    x = tf.keras.layers.Concatenate()([x, embedding])
+    output = tf.keras.layers.Dense(1)(x)
+
+    return tf.keras.Model(inputs=[values, mask, ticker], outputs=output, name="global_model")
+
+
+def pad_windows(windows, max_window):
+    """
+    Left-pad windows of one length to max_window
+
+    Returns:
+    tuple: Padded values and their mask, both (batch, max_window) float32
+    """
+    windows = np.asarray(windows, dtype=np.float32)
+    batch, window_size = windows.shape
+    if window_size > max_window:
+        raise ValueError(f"Window of {window_size} values is longer than the global model's {max_window}")
+
+    values = np.zeros((batch, max_window), dtype=np.float32)
+    mask = np.zeros((batch, max_window), dtype=np.float32)
+    values[:, max_window - window_size:] = windows
+    mask[:, max_window - window_size:] = 1
+    return values, mask
+
+
+class GlobalModel:
+    def __init__(self, model, tickers, windows):
+        """
+        Compiled rollout of the global model over rows of different tickers
+
+        The mask of a row never changes during a rollout, so every ticker
+        keeps reading exactly its own window_size latest values.
+
+        Parameters:
+        model (tf.keras.Model): Model built by build_model
+        tickers (list): Tickers, their position is their embedding id
+        windows (dict): Window size of every ticker
+        """
+        import tensorflow as tf
+
+        self.model = model
+        self.tickers = list(tickers)
+        self.windows = dict(windows)
+        self.max_window = max(self.windows.values())
+        self._ids = {stock: index for index, stock in enumerate(self.tickers)}
+        self._views = {}
+        self._lock = threading.Lock()
+
+        signature = [
+            tf.TensorSpec(shape=[None, self.max_window], dtype=tf.float32),
+            tf.TensorSpec(shape=[None, self.max_window], dtype=tf.float32),
+            tf.TensorSpec(shape=[None], dtype=tf.int32),
+        ]
+        self._rollout = tf.function(self._rollout_fn, input_signature=signature + [
+            tf.TensorSpec(shape=[], dtype=tf.int32),
+        ])
+        # Traced on first use only, by probabilistic forecasts
+        self._noisy_rollout = tf.function(self._noisy_rollout_fn, input_signature=signature + [
+            tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+        ])
+
+    @classmethod
+    def load(cls, directory):
+        """Load a global model written by train_global.py"""
+        import tensorflow as tf
+
+        with open(os.path.join(directory, META_FILE)) as f:
+            meta = json.load(f)
+        model = tf.keras.models.load_model(os.path.join(directory, MODEL_FILE), compile=False)
+        return cls(model, meta["tickers"], meta["windows"])
+
+    def save(self, directory):
+        """Write the model and its tickers, each swapped in atomically"""
+        os.makedirs(directory, exist_ok=True)
+        # The tickers go first, the registry reloads when the model file changes
+        write_meta(directory, self.tickers, self.windows)
+        path = os.path.join(directory, MODEL_FILE)
+        tmp_path = f"{path}.{os.getpid()}.tmp.h5"
+        self.model.save(tmp_path)
+        os.replace(tmp_path, path)
+
+    def ticker_id(self, stock):
+        ticker_id = self._ids.get(stock)
+        if ticker_id is None:
+            raise ValueError(f"{stock} is not covered by the global model")
+        return ticker_id
+
+    def ticker(self, stock):
+        """Get the single-ticker view of the model, with the same rollout contract as inference.RolloutEngine"""
+        ticker_id = self.ticker_id(stock)
+        with self._lock:
+            view = self._views.get(stock)
+            if view is None:
+                view = self._views[stock] = GlobalTicker(self, stock, ticker_id, self.windows[stock])
+            return view
+
+    def _rollout_fn(self, values, mask, ticker_ids, n_steps):
+        return self._loop(values, mask, ticker_ids, n_steps)
+
+    def _noisy_rollout_fn(self, values, mask, ticker_ids, noise):
+        import tensorflow as tf
+
+        return self._loop(values, mask, ticker_ids, tf.shape(noise)[1], noise)
+
+    def _loop(self, values, mask, ticker_ids, n_steps, noise=None):
+        import tensorflow as tf
+
+        batch = tf.shape(values)[0]
+        tickers = ticker_ids[:, tf.newaxis]
+        predictions = tf.TensorArray(tf.float32, size=n_steps)
+
+        def step(i, values, predictions):
+            prediction = tf.reshape(self.model([values, mask, tickers], training=False), [batch])
+            if noise is not None:
+                prediction = prediction + noise[:, i]
+            predictions = predictions.write(i, prediction)
+
+            # Drop the oldest value and append the prediction, the mask stays in place
+            values = tf.concat([values[:, 1:], prediction[:, tf.newaxis]], axis=1)
+            return i + 1, values, predictions
+
+        _, values, predictions = tf.while_loop(
+            lambda i, values, predictions: i < n_steps,
+            step,
+            [tf.constant(0), values, predictions],
+        )
+
+        return tf.transpose(predictions.stack()), values
+
+    def rollout_padded(self, values, mask, ticker_ids, n_steps, noise=None):
+        """
+        Forecast n_steps values for each padded row
+
+        Returns:
+        tuple: Predictions of shape (batch, n_steps) and the final padded values
+        """
+        import tensorflow as tf
+
+        values = tf.constant(np.asarray(values, dtype=np.float32))
+        mask = tf.constant(np.asarray(mask, dtype=np.float32))
+        ticker_ids = tf.constant(np.asarray(ticker_ids, dtype=np.int32))
+        if noise is not None:
+            noise = np.asarray(noise, dtype=np.float32)[:, :n_steps]
+            predictions, values = self._noisy_rollout(values, mask, ticker_ids, tf.constant(noise))
+        else:
+            predictions, values = self._rollout(values, mask, ticker_ids, tf.constant(n_steps, dtype=tf.int32))
+        return predictions.numpy(), values.numpy()
+
+    def rollout_tickers(self, stocks, windows, n_steps):
+        """
+        Forecast several tickers in one rollout
+
+        Parameters:
+        stocks (list): Ticker of every row
+        windows (list): Last window_size values of every row, window sizes may differ
+        n_steps (int): Number of future values to predict
+
+        Returns:
+        np.ndarray: Predictions of shape (len(stocks), n_steps)
+        """
+        values = np.zeros((len(stocks), self.max_window), dtype=np.float32)
+        mask = np.zeros_like(values)
+        for row, window in enumerate(windows):
+            values[row:row + 1], mask[row:row + 1] = pad_windows(np.asarray(window)[np.newaxis], self.max_window)
+        ticker_ids = [self.ticker_id(stock) for stock in stocks]
+        predictions, _ = self.rollout_padded(values, mask, ticker_ids, n_steps)
+        return predictions
+
+
+class GlobalTicker:
+    def __init__(self, group, stock, ticker_id, window_size):
+        """
+        One ticker of a GlobalModel
+
+        Stands in for a per-ticker model in ModelEntry.model: it implements
+        rollout and forecast itself, so inference.get_engine returns it as is.
+        """
+        self.group = group
+        self.stock = stock
+        self.ticker_id = ticker_id
+        self.window_size = window_size
+
+    def rollout(self, windows, n_steps, noise=None):
+        """Same contract as inference.RolloutEngine.rollout"""
+        windows = np.asarray(windows, dtype=np.float32)
+        values, mask = pad_windows(windows, self.group.max_window)
+        ticker_ids = np.full(len(windows), self.ticker_id, dtype=np.int32)
+        predictions, values = self.group.rollout_padded(values, mask, ticker_ids, n_steps, noise)
+        return predictions, values[:, self.group.max_window - windows.shape[1]:]
+
+    def forecast(self, series, window_size, n_steps):
+        """Same contract as inference.RolloutEngine.forecast"""
+        predictions, _ = self.rollout(np.asarray(series)[np.newaxis, -window_size:], n_steps)
+        return predictions[0]
+
+
+def write_meta(directory, tickers, windows):
+    path = os.path.join(directory, META_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({
+            "tickers": list(tickers),
+            "windows": {stock: int(windows[stock]) for stock in tickers},
+            "max_window": int(max(windows[stock] for stock in tickers)),
+        }, f, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,53 @@
+# Production serving: gunicorn -c gunicorn.conf.py index:app
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", max(1, multiprocessing.cpu_count() // 2)))
+worker_class = "gthread"
+threads = int(os.environ.get("WORKER_THREADS", 8))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 120))
+
+# Import TensorFlow and load every ticker into the registry once in the master, workers share it copy-on-write
+preload_app = True
+
+# Cores are split between workers so TensorFlow does not oversubscribe them
+intra_op_threads = int(os.environ.get("TF_INTRA_OP_THREADS", max(1, multiprocessing.cpu_count() // workers)))
+inter_op_threads = int(os.environ.get("TF_INTER_OP_THREADS", 2))
+
+# OpenMP and BLAS read their thread counts once, when numpy is first imported, i.e. by the app in the master
+for name in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(name, str(intra_op_threads))
+
+
+def on_starting(server):
+    import index
+    import serving
+    from utils import get_tickers
+
+    # Download changed artifacts once per replica, before anything reads them
+    if index.artifact_sync is not None:
+        server.log.info(f"Artifact sync: {index.artifact_sync.sync()}")
+    serving.preload(index.registry, get_tickers())
+
+
+def post_fork(server, worker):
+    import index
+    import serving
+
+    serving.configure_threads(intra_op_threads, inter_op_threads, runtime=index.registry.runtime)
+
+
+def post_worker_init(worker):
+    import index
+    import serving
+    from utils import get_tickers
+
+    # Warming every model up front could outlast the worker timeout, so it runs in the background
+    # and GET /ready answers 503 until it is done
+    serving.warm_up_in_background(index.registry, get_tickers())
+    # One worker of the replica refreshes the clustering in the background, the others load its snapshot
+    index.risk_service.start()
+    # Workers poll the bucket, the cache lock lets one of them sync at a time
+    if index.artifact_sync is not None:
+        index.artifact_sync.start(index.ARTIFACT_SYNC_INTERVAL)
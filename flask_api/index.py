@@ -1,20 +1,50 @@
-from flask import Flask, request, jsonify
-from recommendation_k_means import StockClusteringSystem
-from datetime import datetime, timedelta
-import tensorflow as tf
-import numpy as np
-import joblib
-import pandas as pd
-import json
+from flask import Flask, Response, g, request, jsonify
+from datetime import datetime
+import itertools
 import os
+import threading
+import time
+
+import numpy as np
+
+# Heavy dependencies (tensorflow, pandas, yfinance, sklearn, ta, google-cloud-storage) are imported
+# on first use by the endpoint or backend that needs them, see startup_profile.py
+from artifact_sync import ArtifactSync, GCSObjectStore
+from batching import MicroBatcher
+from concurrency import BoundedExecutor, Limiter, Overloaded
+from forecast_cache import ForecastCache
+import metrics
+import profiling
+from metrics import stage, timed
+from model_registry import ModelRegistry
+from precompute import PrecomputedForecasts
+from responses import (
+    DATE_STYLES,
+    FORMATS,
+    STREAM_FORMATS,
+    columnar_body,
+    encode_event,
+    forecast_events,
+    inverse_scale,
+    msgpack_body,
+    prediction_body,
+    stream_json
+)
+from risk_profile import RiskProfileService
+import serving
+from uncertainty import get_residuals, monte_carlo_forecast, percentage_change_bands, percentile_bands
+from inference import get_engine
 from utils import (
     extended_forecast,
+    extended_forecast_batch,
+    extended_forecast_chunks,
     parse_data_from_file,
     load_scaler_from_gcs,
     load_model_from_gcs,
     load_csv_from_gcs,
     load_from_gcs,
-    get_window
+    get_window,
+    get_tickers
 )
 
 app = Flask(__name__)
@@ -22,6 +52,356 @@ app = Flask(__name__)
 BUCKET_NAME = "finsight-ml-model"
 DATA_FROM = 2024
 
+# Models, scalers and series are loaded once per ticker and shared by all requests
+registry = ModelRegistry(
+    max_size=int(os.environ.get("MODEL_REGISTRY_SIZE", 32)),
+    runtime=os.environ.get("FORECAST_RUNTIME", "keras"),
+    # GLOBAL_MODEL_DIR serves every ticker from the one model written by train_global.py
+    global_model=os.environ.get("GLOBAL_MODEL_DIR") or None,
+    # MODEL_VARIANTS=1 serves the fastest float16/int8 variant that passed the gate of quantize.py
+    variants=os.environ.get("MODEL_VARIANTS") == "1"
+)
+MAX_BATCH_REQUESTS = 64
+# Default number of Monte Carlo paths of mode=probabilistic
+MC_PATHS = int(os.environ.get("MC_PATHS", 100))
+# JSON bodies of at least this many weeks are streamed instead of built in memory
+STREAM_MIN_WEEKS = int(os.environ.get("STREAM_MIN_WEEKS", 52 * 20))
+
+# Forecasts are deterministic for a given model, scaler and CSV, so they are cached by content hash
+forecast_cache = ForecastCache(
+    max_size=int(os.environ.get("FORECAST_CACHE_SIZE", 256)),
+    ttl=float(os.environ.get("FORECAST_CACHE_TTL", 3600)),
+    cache_dir=os.environ.get("FORECAST_CACHE_DIR") or None
+)
+
+# PREDICT_MODE=precomputed answers from the file written by precompute.py, live inference is the fallback
+PREDICT_MODE = os.environ.get("PREDICT_MODE", "live")
+precomputed = PrecomputedForecasts(os.environ.get("PRECOMPUTED_PATH", "forecasts.npz"), registry)
+
+# Clustering is refreshed in the background, /riskprofile only reads the latest result
+risk_service = RiskProfileService(
+    interval=float(os.environ.get("RISKPROFILE_REFRESH_INTERVAL", 3600)),
+    backend=os.environ.get("CLUSTERING_BACKEND", "auto"),
+    # Workers of a replica share one refresher, the others load the snapshot it publishes here
+    state_dir=os.path.join(os.environ.get("PRICE_STORE_DIR", "store"), "riskprofile")
+)
+RISKPROFILE_WAIT = float(os.environ.get("RISKPROFILE_WAIT", 120))
+
+# CPU-bound inference runs on its own bounded pool and /riskprofile has its own concurrency limit,
+# so requests waiting on Yahoo Finance can never take every worker thread from /predict
+inference_pool = BoundedExecutor(
+    "inference",
+    max_workers=int(os.environ.get("INFERENCE_THREADS", 2)),
+    max_queue=int(os.environ.get("INFERENCE_QUEUE", 16))
+)
+# PREDICT_BATCHING=1 coalesces concurrent /predict rollouts of the same ticker into one batched rollout
+batcher = MicroBatcher(
+    max_batch_size=int(os.environ.get("BATCH_MAX_SIZE", 32)),
+    max_wait=float(os.environ.get("BATCH_MAX_WAIT_MS", 5)) / 1000
+) if os.environ.get("PREDICT_BATCHING") == "1" else None
+riskprofile_limiter = Limiter("riskprofile", int(os.environ.get("RISKPROFILE_CONCURRENCY", 2)), retry_after=30)
+
+# ARTIFACT_BUCKET keeps models/, scalers/ and csv/ in sync with the bucket, only changed blobs are downloaded
+artifact_sync = ArtifactSync(
+    GCSObjectStore(os.environ["ARTIFACT_BUCKET"]),
+    cache_dir=os.environ.get("ARTIFACT_CACHE_DIR", ".artifacts"),
+    max_workers=int(os.environ.get("ARTIFACT_SYNC_WORKERS", 8))
+) if os.environ.get("ARTIFACT_BUCKET") else None
+ARTIFACT_SYNC_INTERVAL = float(os.environ.get("ARTIFACT_SYNC_INTERVAL", 300))
+
+# PROFILE_TOKEN enables per-request profiling, requests sending it in X-Profile or ?profile= are sampled
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL = float(os.environ.get("PROFILE_INTERVAL_MS", 5)) / 1000
+profile_lock = threading.Lock()
+
+@app.before_request
+def start_profile():
+    presented = request.headers.get("X-Profile") or request.args.get("profile")
+    if not profiling.authorized(PROFILE_TOKEN, presented):
+        return
+    # One profiled request at a time per worker, the others are served normally
+    if not profile_lock.acquire(blocking=False):
+        g.profile_busy = True
+        return
+    g.profiler = profiling.SamplingProfiler(interval=PROFILE_INTERVAL).__enter__()
+
+@app.after_request
+def stop_profile(response):
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        if g.pop("profile_busy", False):
+            response.headers["X-Profile-Id"] = "busy"
+        return response
+    try:
+        profiler.__exit__(None, None, None)
+        response.headers["X-Profile-Id"] = profiling.save(profiler, PROFILE_DIR, {
+            "method": request.method,
+            "path": request.path,
+            "args": {key: value for key, value in request.args.items() if key != "profile"},
+            "body": request.get_json(silent=True),
+            "status": response.status_code,
+            "content_length": response.content_length,
+            "streamed": response.is_streamed,
+        })
+    finally:
+        profile_lock.release()
+    return response
+
+@app.teardown_request
+def release_profile(exc):
+    # after_request is skipped when the view raised, stop the sampler anyway
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiler.__exit__(None, None, None)
+        profile_lock.release()
+
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or "unknown"
+    metrics.REQUESTS_IN_FLIGHT.inc(endpoint=g.metrics_endpoint)
+
+@app.after_request
+def observe_request(response):
+    metrics.REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=g.metrics_endpoint,
+        status=response.status_code)
+    return response
+
+@app.teardown_request
+def end_request_metrics(exc):
+    if "metrics_endpoint" in g:
+        metrics.REQUESTS_IN_FLIGHT.dec(endpoint=g.metrics_endpoint)
+
+@metrics.REGISTRY.collector
+def service_metrics():
+    """Counters owned by the registry, caches, pools and the risk profile service, read on every scrape"""
+    registry_stats = registry.stats()
+    cache_stats = forecast_cache.stats()
+    families = [
+        ("finsight_cache_hits_total", "counter", "Cache hits, the hit rate is hits / (hits + misses)", [
+            ({"cache": "model_registry"}, registry_stats["hits"]),
+            ({"cache": "forecast"}, cache_stats["hits"] + cache_stats["disk_hits"]),
+            ({"cache": "precomputed"}, precomputed.hits),
+        ]),
+        ("finsight_forecast_cache_disk_hits_total", "counter", "Forecast cache hits served by the on-disk tier", [
+            ({}, cache_stats["disk_hits"]),
+        ]),
+        ("finsight_cache_misses_total", "counter", "Cache misses", [
+            ({"cache": "model_registry"}, registry_stats["misses"]),
+            ({"cache": "forecast"}, cache_stats["misses"]),
+            ({"cache": "precomputed"}, precomputed.misses),
+        ]),
+        ("finsight_cache_evictions_total", "counter", "Cache evictions", [
+            ({"cache": "model_registry"}, registry_stats["evictions"]),
+            ({"cache": "forecast"}, cache_stats["evictions"]),
+        ]),
+        ("finsight_cache_entries", "gauge", "Entries held in memory", [
+            ({"cache": "model_registry"}, registry_stats["size"]),
+            ({"cache": "forecast"}, cache_stats["size"]),
+        ]),
+        ("finsight_model_reloads_total", "counter", "Models reloaded because their files changed", [
+            ({}, registry_stats["reloads"]),
+        ]),
+        ("finsight_pool_in_flight", "gauge", "Tasks running or queued on a pool or limiter", [
+            ({"pool": "inference"}, inference_pool.in_flight),
+            ({"pool": "riskprofile"}, riskprofile_limiter.in_flight),
+        ]),
+        ("finsight_pool_rejected_total", "counter", "Tasks rejected with 429 because a pool was full", [
+            ({"pool": "inference"}, inference_pool.rejected),
+            ({"pool": "riskprofile"}, riskprofile_limiter.rejected),
+        ]),
+    ]
+    if batcher is not None:
+        families.append(("finsight_batcher_total", "counter", "Micro-batches run and requests they served", [
+            ({"kind": "batches"}, batcher.batches),
+            ({"kind": "requests"}, batcher.requests),
+        ]))
+    snapshot_age = risk_service.snapshot_age()
+    if snapshot_age is not None:
+        families.append(("finsight_riskprofile_snapshot_age_seconds", "gauge", "Age of the served clustering", [
+            ({}, round(snapshot_age, 3)),
+        ]))
+    return families
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.errorhandler(Overloaded)
+def overloaded(e):
+    return jsonify({
+        "status": "failed",
+        "error": str(e)
+    }), 429, {"Retry-After": str(e.retry_after)}
+
+# add_gap(steps) < 1 would forecast no week past DATA_FROM
+HORIZON_ERROR = f"Steps must forecast at least one year past {DATA_FROM}"
+
+def add_gap(steps):
+    '''
+    Kalo request dari tahun 2025 dengan steps 5, maka akan prediksi s/d 2030
+    Karena data sampai dengan tahun 2024, maka kita harus menambahkan 1 (2025 - 2024)
+    '''
+    current_year = int(datetime.now().year)
+    return steps + current_year - DATA_FROM
+
+def forecast_prices(entry, steps, predicted_values):
+    """Convert forecasted (scaled) values to prices and their weekly times"""
+    import pandas as pd
+
+    # Generate Future Times
+    future_time  = pd.date_range(start=entry.time[-1], periods=52 * steps + 1, freq='W')[1:]
+
+    # Convert to actual price
+    with stage("predict", "inverse_transform"):
+        predicted_actual = inverse_scale(entry.scaler, predicted_values)
+
+    return predicted_actual, future_time.values
+
+def precomputed_forecast(stock, steps):
+    """Get materialized prices and times of a forecast, or None on a miss or in live mode"""
+    if PREDICT_MODE != "precomputed":
+        return None
+    return precomputed.get(stock, 52 * steps)
+
+def cached_forecast(entry, steps):
+    """Get cached prices and times of a forecast, or None on a miss"""
+    return forecast_cache.get(entry.stock, entry.version, 52 * steps)
+
+def store_forecast(entry, steps, predicted_values):
+    """Convert forecasted values to prices and times and cache them"""
+    prices, times = forecast_prices(entry, steps, predicted_values)
+    forecast_cache.put(entry.stock, entry.version, prices, times)
+    return prices, times
+
+def live_forecast(stock, steps, window_size):
+    """Get prices and times of a forecast from the cache, or run the rollout"""
+    entry = registry.get(stock)
+
+    # Predict, unless an equal or longer forecast is already cached
+    cached = cached_forecast(entry, steps)
+    if cached is None:
+        if batcher is not None:
+            # Only the batch leader takes an inference thread, the other requests wait for its result
+            predicted_values = batcher.forecast(get_engine(entry.model), entry.series[-window_size:], 52 * steps,
+                run=lambda fn, *args: inference_pool.run(timed("predict", "extended_forecast", fn), *args))
+        else:
+            predicted_values = inference_pool.run(timed("predict", "extended_forecast", extended_forecast),
+                entry.model, entry.series, window_size, forecast_steps=steps)
+        cached = store_forecast(entry, steps, predicted_values)
+    return cached
+
+def forecast_chunks(stock, steps, window_size, chunk_size=52):
+    """
+    Yield prices and times of a forecast chunk_size weeks at a time
+
+    Materialized and cached forecasts are sliced, otherwise every chunk is
+    rolled out on the inference pool right before it is yielded.
+    """
+    import pandas as pd
+
+    cached = precomputed_forecast(stock, steps)
+    entry = None
+    if cached is None:
+        entry = registry.get(stock)
+        cached = cached_forecast(entry, steps)
+    if cached is not None:
+        prices, times = cached
+        for start in range(0, len(prices), chunk_size):
+            yield prices[start:start + chunk_size], times[start:start + chunk_size]
+        return
+
+    # Weekly times follow from the first one, like in precompute.py
+    first_time = pd.date_range(start=entry.time[-1], periods=2, freq='W')[1].to_datetime64()
+    values = extended_forecast_chunks(entry.model, entry.series, window_size, steps, chunk_size)
+    start = 0
+    while True:
+        predicted_values = inference_pool.run(next, values, None)
+        if predicted_values is None:
+            return
+        times = first_time + np.timedelta64(7, 'D') * np.arange(start, start + len(predicted_values))
+        start += len(predicted_values)
+        yield inverse_scale(entry.scaler, predicted_values), times
+
+def build_prediction(steps, prices, times, dates="http"):
+    """Build the /predict response body from forecasted prices and times"""
+    return prediction_body(prices, times, DATA_FROM, DATA_FROM + steps, dates)
+
+def response_options():
+    """
+    Get the response format of /predict from the query string
+
+    format: json (default), columnar or msgpack
+    dates: http (default for json), iso or epoch (default for columnar)
+    stream: 1 to stream the JSON body, long horizons are always streamed
+    mode: deterministic (default) or probabilistic, which adds p5/p50/p95 bands
+    over `paths` Monte Carlo paths (default MC_PATHS, 100) drawn with `seed` (default 0)
+    """
+    options = {
+        "format": request.args.get("format", "json"),
+        "dates": request.args.get("dates"),
+        "stream": request.args.get("stream") == "1",
+        "mode": request.args.get("mode", "deterministic"),
+        "paths": int(request.args.get("paths", MC_PATHS)),
+        "seed": int(request.args.get("seed", 0)),
+    }
+    if options["mode"] not in ("deterministic", "probabilistic"):
+        raise ValueError(f"Unknown mode {options['mode']}, expected deterministic or probabilistic")
+    if options["mode"] == "probabilistic" and options["format"] == "msgpack":
+        raise ValueError("mode=probabilistic is available with format=json or columnar")
+    if options["format"] not in FORMATS:
+        raise ValueError(f"Unknown format {options['format']}, expected one of {', '.join(FORMATS)}")
+    if options["dates"] is not None and options["dates"] not in DATE_STYLES:
+        raise ValueError(f"Unknown dates {options['dates']}, expected one of {', '.join(DATE_STYLES)}")
+    return options
+
+def forecast_bands(stock, steps, window_size, n_paths, seed):
+    """Percentile bands of the prices over Monte Carlo paths, rolled out as one batch"""
+    entry = registry.get(stock)
+    with stage("predict", "monte_carlo"):
+        errors = get_residuals(entry, window_size)
+        paths = monte_carlo_forecast(entry.model, entry.series, window_size, 52 * steps, errors, n_paths, seed)
+    prices = inverse_scale(entry.scaler, paths).reshape(paths.shape)
+    return {
+        "bands": {name: band.tolist() for name, band in percentile_bands(prices).items()},
+        "percentage_change_bands": percentage_change_bands(prices),
+        "paths": n_paths
+    }
+
+def respond_prediction(steps, prices, times, options, bands=None):
+    """Render forecasted prices and times in the requested format"""
+    # Streamed bodies are serialized while they are sent, only their setup is timed here
+    with stage("predict", "serialization"):
+        return render_prediction(steps, prices, times, options, bands)
+
+def render_prediction(steps, prices, times, options, bands=None):
+    year_to = DATA_FROM + steps
+    if bands is not None:
+        # Probabilistic responses are built in memory, the bands dominate their size anyway
+        if options["format"] == "columnar":
+            body = columnar_body(prices, times, DATA_FROM, year_to, options["dates"] or "epoch")
+        else:
+            body = build_prediction(steps, prices, times, options["dates"] or "http")
+        body.update(bands)
+        return jsonify(body)
+    if options["format"] == "msgpack":
+        return Response(msgpack_body(prices, times, DATA_FROM, year_to), mimetype="application/msgpack")
+    if options["format"] == "columnar":
+        return jsonify(columnar_body(prices, times, DATA_FROM, year_to, options["dates"] or "epoch"))
+    if options["stream"] or len(prices) >= STREAM_MIN_WEEKS:
+        return Response(stream_json(prices, times, DATA_FROM, year_to, options["dates"] or "http"),
+            mimetype="application/json")
+    return jsonify(build_prediction(steps, prices, times, options["dates"] or "http"))
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    is_ready, warm_up = serving.readiness()
+    return jsonify({
+        "status": "ready" if is_ready else "warming_up",
+        "warm_up": warm_up
+    }), 200 if is_ready else 503
+
 @app.route('/predict', methods=['POST'])
 def predict():  
     data = request.get_json()
@@ -34,16 +414,14 @@ def predict():
     try:
         # Get stock and steps from request
         stock = str(data['stock']).upper()
-        steps = int(data['steps'])
-
-        # Current Year
-        current_year = int(datetime.now().year)
-        '''
-        Kalo request dari tahun 2025 dengan steps 5, maka akan prediksi s/d 2030
-        Karena data sampai dengan tahun 2024, maka kita harus menambahkan 1 (2025 - 2024)
-        '''
-        gap = current_year - DATA_FROM
-        steps += gap
+        steps = add_gap(int(data['steps']))
+        if steps < 1:
+            return jsonify({
+                "status": "failed",
+                "error": HORIZON_ERROR
+            }), 400
+        options = response_options()
+
         WINDOW_SIZE = get_window(stock)
         if not WINDOW_SIZE:
             return jsonify({
@@ -82,43 +460,24 @@ def predict():
         # })
         # ===== UNCOMMENT UNTUK DOWNLOAD DARI GCS =====
 
-        # Load model and scaler based on the stock
-        model = tf.keras.models.load_model(f"models/{stock}/model_saham.h5")
-        scaler = joblib.load(f"scalers/{stock}/scaler.pkl")
-
-        # Get the data
-        # TIME, SERIES = parse_data_from_file(local_csv_path + "/data_saham.csv")
-        TIME, SERIES = parse_data_from_file(f"csv/{stock}/data_saham.csv")
-        SERIES = scaler.fit_transform(SERIES.reshape(-1, 1)).flatten()
-
-        # Generate Future Times
-        future_time  = pd.date_range(start=TIME[-1], periods=52 * steps + 1, freq='W')[1:]
+        # Uncertainty bands always need the model, N perturbed paths are one batched rollout
+        bands = None
+        if options["mode"] == "probabilistic":
+            bands = inference_pool.run(forecast_bands, stock, steps, WINDOW_SIZE, options["paths"], options["seed"])
 
-        # Predict
-        predicted_values = extended_forecast(model, SERIES, WINDOW_SIZE, forecast_steps=steps)
+        # Serve a materialized forecast without loading the model at all
+        cached = precomputed_forecast(stock, steps)
+        if cached is not None:
+            return respond_prediction(steps, *cached, options, bands), 200
 
-        # Convert to actual price
-        predicted_actual = scaler.inverse_transform([predicted_values]).flatten().tolist()
-
-        # Percentage Change
-        percentage_change = round(
-            ((predicted_actual[-1] / predicted_actual[0]) - 1) * 100,
-            2
-        )
+        # Load model, scaler and the scaled series based on the stock, then predict on the inference pool
+        # TIME, SERIES = parse_data_from_file(local_csv_path + "/data_saham.csv")
+        cached = live_forecast(stock, steps, WINDOW_SIZE)
 
         # Response
-        response = {
-            'status': 'success',
-            'prediction': {
-                'prices': predicted_actual,
-                'times': future_time.tolist()
-            },
-            'year_from': str(DATA_FROM),
-            'year_to': str(DATA_FROM + steps),
-            'percentage_change': percentage_change
-        }
-
-        return jsonify(response), 200
+        return respond_prediction(steps, *cached, options, bands), 200
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({
             "status": "failed",
@@ -133,6 +492,148 @@ def predict():
     #     'prediction': predicted_actual.flatten().tolist()[-1]
     # })
     
+@app.route('/predict/stream', methods=['GET', 'POST'])
+def predict_stream():
+    """
+    Stream a forecast as it is predicted
+
+    Takes stock and steps from the JSON body or the query string (GET, for EventSource).
+    format: ndjson (default) or sse, also picked by an Accept: text/event-stream header
+    chunk: year (default) or week, the number of weeks per message
+    dates: http (default), iso or epoch
+    """
+    data = request.get_json(silent=True) if request.method == 'POST' else request.args
+    if not data or "stock" not in data or "steps" not in data:
+        return jsonify({
+            "status": "failed",
+            "error": "Missing stock or steps"
+        }),400
+
+    try:
+        stock = str(data['stock']).upper()
+        steps = add_gap(int(data['steps']))
+        if steps < 1:
+            return jsonify({
+                "status": "failed",
+                "error": HORIZON_ERROR
+            }), 400
+
+        accepts_sse = "text/event-stream" in request.headers.get("Accept", "")
+        style = request.args.get("format", "sse" if accepts_sse else "ndjson")
+        chunk = request.args.get("chunk", "year")
+        dates = request.args.get("dates", "http")
+        if style not in STREAM_FORMATS:
+            raise ValueError(f"Unknown format {style}, expected one of {', '.join(STREAM_FORMATS)}")
+        if chunk not in ("year", "week"):
+            raise ValueError(f"Unknown chunk {chunk}, expected year or week")
+        if dates not in DATE_STYLES:
+            raise ValueError(f"Unknown dates {dates}, expected one of {', '.join(DATE_STYLES)}")
+
+        WINDOW_SIZE = get_window(stock)
+        if not WINDOW_SIZE:
+            return jsonify({
+                "status": "failed",
+                "error": "Stock unavailable"
+            }), 404
+
+        chunks = forecast_chunks(stock, steps, WINDOW_SIZE, chunk_size=52 if chunk == "year" else 1)
+        # The first chunk is predicted before the response starts, so loading errors and overload still get a status
+        first = next(chunks)
+    except Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({
+            "status": "failed",
+            "error": str(e)
+        }),400
+
+    def generate():
+        events = forecast_events(itertools.chain([first], chunks), DATA_FROM, DATA_FROM + steps, 52 * steps, dates)
+        try:
+            for name, payload in events:
+                yield encode_event(name, payload, style)
+        except Exception as e:
+            # Headers are already sent, the failure is reported in the stream
+            yield encode_event("error", {"status": "failed", "error": str(e)}, style)
+
+    mimetype = "text/event-stream" if style == "sse" else "application/x-ndjson"
+    return Response(generate(), mimetype=mimetype, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    data = request.get_json()
+    if not data or not isinstance(data.get("requests"), list) or not data["requests"]:
+        return jsonify({
+            "status": "failed",
+            "error": "Missing requests"
+        }),400
+
+    if len(data["requests"]) > MAX_BATCH_REQUESTS:
+        return jsonify({
+            "status": "failed",
+            "error": f"Too many requests, maximum is {MAX_BATCH_REQUESTS}"
+        }),400
+
+    try:
+        results = inference_pool.run(run_batch, data["requests"])
+
+        return jsonify({
+            "status": "success",
+            "results": results
+        }), 200
+    except Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({
+            "status": "failed",
+            "error": str(e)
+        }),400
+
+def run_batch(items):
+    """Forecast every item of a /predict/batch request"""
+    # Each item gets the same body /predict would return for it
+    results = [None] * len(items)
+    forecasts = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or "stock" not in item or "steps" not in item:
+            results[index] = {"status": "failed", "error": "Missing stock or steps"}
+            continue
+
+        stock = str(item['stock']).upper()
+        WINDOW_SIZE = get_window(stock)
+        if not WINDOW_SIZE:
+            results[index] = {"status": "failed", "error": "Stock unavailable"}
+            continue
+
+        steps = add_gap(int(item['steps']))
+        if steps < 1:
+            results[index] = {"status": "failed", "error": HORIZON_ERROR}
+            continue
+        cached = precomputed_forecast(stock, steps)
+        if cached is not None:
+            results[index] = build_prediction(steps, *cached)
+            continue
+
+        entry = registry.get(stock)
+        cached = cached_forecast(entry, steps)
+        if cached is not None:
+            results[index] = build_prediction(steps, *cached)
+            continue
+
+        forecasts.append((index, entry, WINDOW_SIZE, steps))
+
+    # Run every remaining rollout together
+    with stage("predict_batch", "extended_forecast_batch"):
+        predicted = extended_forecast_batch([
+            (entry.model, entry.series, WINDOW_SIZE, steps)
+            for _, entry, WINDOW_SIZE, steps in forecasts
+        ])
+
+    for (index, entry, _, steps), predicted_values in zip(forecasts, predicted):
+        results[index] = build_prediction(steps, *store_forecast(entry, steps, predicted_values))
+
+    return results
+
 @app.route('/riskprofile', methods=['POST'])
 def riskProfile():
     data = request.get_json()
@@ -144,21 +645,15 @@ def riskProfile():
         }),400
     
     riskProfile = data["riskProfile"]
-    
-    tickers = ["^GSPC", "ADRO.JK", "ANTM.JK", "ASII.JK", "BBCA.JK", "BBNI.JK", "BBRI.JK", "BMRI.JK", "CTRA.JK", "GC=F", "GGRM.JK", "IDR=X", "INDF.JK", "INDY.JK", "LPKR.JK", "MYOR.JK", "PWON.JK", "UNVR.JK"]
 
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=365 * 2)  
     try: 
-        stock_system = StockClusteringSystem(tickers, start_date.strftime('%Y-%m-%d'),
-            end_date.strftime('%Y-%m-%d'))
-        
-        stock_system.fetch_data()
-        stock_system.create_feature_matrix()
-        stock_system.preprocess_features()
-        stock_system.perform_clustering(n_clusters=3)
-        
-        recommendations = stock_system.get_recommendations(riskProfile)
+        with riskprofile_limiter:
+            recommendations = risk_service.recommendations(riskProfile, timeout=RISKPROFILE_WAIT)
+        if recommendations is None:
+            return jsonify({
+                "status": "failed",
+                "error": "Risk profiles are not available yet"
+            }), 503, {"Retry-After": "30"}
         
         return jsonify({
             "status": "success",
@@ -167,6 +662,8 @@ def riskProfile():
         
         
         
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({
             "status": "failed",
@@ -174,6 +671,11 @@ def riskProfile():
         }),400
     
 
-# Run Flask app
+# Run Flask app (development server only, production uses gunicorn.conf.py)
 if __name__ == '__main__':
+    if artifact_sync is not None:
+        print(f"Artifact sync: {artifact_sync.sync()}")
+        artifact_sync.start(ARTIFACT_SYNC_INTERVAL)
+    risk_service.start()
+    serving.warm_up_in_background(registry, get_tickers())
     app.run(debug=True,host="0.0.0.0", port=8080)
\ No newline at end of file
@@ -0,0 +1,355 @@
+import json
+import threading
+import weakref
+
+import numpy as np
+
+
+class RolloutEngine:
+    def __init__(self, model):
+        """
+        Compiled autoregressive rollout of a window model
+
+        The whole recursive forecast runs inside one tf.function: every step
+        calls the model directly and shifts the prediction into the window,
+        so there is no Keras predict overhead and no NumPy copy per step.
+
+        Parameters:
+        model (tf.keras.Model): Model mapping a (batch, window, 1) input to one value per row
+        """
+        import tensorflow as tf
+
+        self.model = model
+        self._rollout = tf.function(
+            self._rollout_fn,
+            input_signature=[
+                tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                tf.TensorSpec(shape=[], dtype=tf.int32),
+            ],
+        )
+        # Traced on first use only, by probabilistic forecasts
+        self._noisy_rollout = tf.function(
+            self._noisy_rollout_fn,
+            input_signature=[
+                tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+                tf.TensorSpec(shape=[None, None], dtype=tf.float32),
+            ],
+        )
+
+    def _rollout_fn(self, windows, n_steps):
+        return self._loop(windows, n_steps)
+
+    def _noisy_rollout_fn(self, windows, noise):
+        import tensorflow as tf
+
+        return self._loop(windows, tf.shape(noise)[1], noise)
+
+    def _loop(self, windows, n_steps, noise=None):
+        import tensorflow as tf
+
+        batch = tf.shape(windows)[0]
+        predictions = tf.TensorArray(tf.float32, size=n_steps)
+
+        def step(i, window, predictions):
+            prediction = self.model(window[:, :, tf.newaxis], training=False)
+            prediction = tf.reshape(prediction, [batch])
+            if noise is not None:
+                prediction = prediction + noise[:, i]
+            predictions = predictions.write(i, prediction)
+
+            # Drop the oldest value and append the prediction
+            window = tf.concat([window[:, 1:], prediction[:, tf.newaxis]], axis=1)
+            return i + 1, window, predictions
+
+        _, window, predictions = tf.while_loop(
+            lambda i, window, predictions: i < n_steps,
+            step,
+            [tf.constant(0), windows, predictions],
+        )
+
+        return tf.transpose(predictions.stack()), window
+
+    def rollout(self, windows, n_steps, noise=None):
+        """
+        Forecast n_steps values for each window
+
+        Parameters:
+        windows (np.ndarray): Last known values, shape (batch, window_size)
+        n_steps (int): Number of future values to predict
+        noise (np.ndarray): Optional (batch, n_steps) values added to every prediction before
+        it is fed back, for Monte Carlo paths
+
+        Returns:
+        tuple: Predictions of shape (batch, n_steps) and the final windows
+        """
+        import tensorflow as tf
+
+        windows = np.asarray(windows, dtype=np.float32)
+        if noise is not None:
+            noise = np.asarray(noise, dtype=np.float32)[:, :n_steps]
+            predictions, windows = self._noisy_rollout(tf.constant(windows), tf.constant(noise))
+        else:
+            predictions, windows = self._rollout(tf.constant(windows), tf.constant(n_steps, dtype=tf.int32))
+        return predictions.numpy(), windows.numpy()
+
+    def forecast(self, series, window_size, n_steps):
+        """Forecast n_steps values following the end of a single series"""
+        predictions, _ = self.rollout(np.asarray(series)[np.newaxis, -window_size:], n_steps)
+        return predictions[0]
+
+
+_engines = weakref.WeakKeyDictionary()
+_engines_lock = threading.Lock()
+
+
+def is_engine(model):
+    """Whether a model already implements rollout itself, e.g. numpy_runtime.NumpyModel"""
+    return hasattr(model, "rollout")
+
+
+def get_engine(model):
+    """Get the rollout engine of a model, compiling it on first use"""
+    if is_engine(model):
+        return model
+
+    with _engines_lock:
+        engine = _engines.get(model)
+        if engine is None:
+            engine = RolloutEngine(model)
+            _engines[model] = engine
+        return engine
+
+
+def _activation(name):
+    import tensorflow as tf
+
+    activations = {"linear": tf.identity, "relu": tf.nn.relu, "tanh": tf.tanh, "sigmoid": tf.sigmoid}
+    if name not in activations:
+        raise ValueError(f"Unsupported activation {name}")
+    return activations[name]
+
+
+def _conv1d(x, layer, weights):
+    import tensorflow as tf
+
+    kernel, bias = weights[f"{layer['name']}/kernel"], weights[f"{layer['name']}/bias"]
+    size, dilation = kernel.shape[1], layer["dilation_rate"]
+    if layer["padding"] == "causal":
+        x = tf.pad(x, [[0, 0], [(size - 1) * dilation, 0], [0, 0]])
+    elif layer["padding"] != "valid":
+        raise ValueError(f"Unsupported Conv1D padding {layer['padding']}")
+
+    steps = x.shape[1] - (size - 1) * dilation
+    out = bias[:, tf.newaxis] + tf.add_n([
+        tf.einsum("mtc,mcf->mtf", x[:, j * dilation:j * dilation + steps], kernel[:, j]) for j in range(size)
+    ])
+    return _activation(layer["activation"])(out)
+
+
+def _lstm(x, prefix, config, weights, go_backwards=False):
+    import tensorflow as tf
+
+    kernel = weights[f"{prefix}/kernel"]
+    recurrent = weights[f"{prefix}/recurrent_kernel"]
+    bias = weights[f"{prefix}/bias"]
+    units = recurrent.shape[1]
+    activation = _activation(config["activation"])
+    recurrent_activation = _activation(config["recurrent_activation"])
+
+    if go_backwards:
+        x = tf.reverse(x, axis=[1])
+
+    # Input projections of every timestep at once, the window is short enough to unroll the recurrence
+    projected = tf.einsum("mtc,mcu->mtu", x, kernel) + bias[:, tf.newaxis]
+    h = tf.zeros([tf.shape(x)[0], units])
+    c = tf.zeros_like(h)
+    outputs = []
+
+    for t in range(x.shape[1]):
+        z = projected[:, t] + tf.einsum("mu,muv->mv", h, recurrent)
+        i = recurrent_activation(z[:, :units])
+        f = recurrent_activation(z[:, units:2 * units])
+        g = activation(z[:, 2 * units:3 * units])
+        o = recurrent_activation(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * activation(c)
+        outputs.append(h)
+
+    if not config["return_sequences"]:
+        return h
+    # Keras aligns the backward sequence with the forward time axis
+    return tf.stack(outputs[::-1] if go_backwards else outputs, axis=1)
+
+
+def _bidirectional(x, layer, weights):
+    import tensorflow as tf
+
+    name = layer["name"]
+    if layer["merge_mode"] != "concat":
+        raise ValueError(f"Unsupported merge mode {layer['merge_mode']}")
+    forward = _lstm(x, f"{name}/forward", layer["forward"], weights)
+    backward = _lstm(x, f"{name}/backward", layer["backward"], weights, go_backwards=True)
+    return tf.concat([forward, backward], axis=-1)
+
+
+def _dense(x, layer, weights):
+    import tensorflow as tf
+
+    equation = "mti,mio->mto" if x.shape.rank == 3 else "mi,mio->mo"
+    bias = weights[f"{layer['name']}/bias"]
+    out = tf.einsum(equation, x, weights[f"{layer['name']}/kernel"])
+    out = out + (bias[:, tf.newaxis] if x.shape.rank == 3 else bias)
+    return _activation(layer["activation"])(out)
+
+
+# Same layers as numpy_runtime, every weight with a leading axis of one row per model
+STACKED_LAYERS = {
+    "Conv1D": _conv1d,
+    "LSTM": lambda x, layer, weights: _lstm(x, layer["name"], layer, weights),
+    "Bidirectional": _bidirectional,
+    "Dense": _dense,
+    "Scale": lambda x, layer, weights: x * layer["factor"],
+}
+
+_exports = weakref.WeakKeyDictionary()
+
+
+def stacked_export(model):
+    """
+    Get a model's layers, named by position, and its weights keyed by them
+
+    Models of the same architecture get identical layer configs whatever
+    Keras named their layers. Exported once per model.
+
+    Returns:
+    tuple: (layers, weights) as written by export_numpy.export
+    """
+    with _engines_lock:
+        cached = _exports.get(model)
+    if cached is not None:
+        return cached
+
+    import export_numpy
+
+    layers, weights = export_numpy.export(model)
+    names = {layer["name"]: str(position) for position, layer in enumerate(layers)}
+    layers = [{**layer, "name": names[layer["name"]]} for layer in layers]
+    weights = {
+        "/".join([names[key.split("/", 1)[0]], key.split("/", 1)[1]]): np.asarray(value, dtype=np.float32)
+        for key, value in weights.items()
+    }
+
+    with _engines_lock:
+        _exports[model] = (layers, weights)
+    return layers, weights
+
+
+class GroupRolloutEngine:
+    def __init__(self, layers, shapes, window_size):
+        """
+        Compiled rollout advancing several models of one architecture together
+
+        The weights of the models are stacked along a leading axis and every
+        step of the loop evaluates all of them as one batched computation,
+        so a group of tickers costs one rollout instead of one per ticker.
+        The weights are inputs of the compiled function, any set of models
+        of the architecture reuses the same trace.
+
+        Parameters:
+        layers (list): Layer configs of stacked_export
+        shapes (dict): Shape of every weight of a single model
+        window_size (int): Length of the windows
+        """
+        import tensorflow as tf
+
+        self.layers = layers
+        self.window_size = window_size
+        self._rollout = tf.function(
+            self._rollout_fn,
+            input_signature=[
+                {key: tf.TensorSpec(shape=[None, *shape], dtype=tf.float32) for key, shape in shapes.items()},
+                tf.TensorSpec(shape=[None, window_size], dtype=tf.float32),
+                tf.TensorSpec(shape=[], dtype=tf.int32),
+            ],
+        )
+
+    def _predict(self, weights, window):
+        import tensorflow as tf
+
+        x = window[:, :, tf.newaxis]
+        for layer in self.layers:
+            x = STACKED_LAYERS[layer["type"]](x, layer, weights)
+        return tf.reshape(x, [tf.shape(window)[0]])
+
+    def _rollout_fn(self, weights, windows, n_steps):
+        import tensorflow as tf
+
+        predictions = tf.TensorArray(tf.float32, size=n_steps)
+
+        def step(i, window, predictions):
+            prediction = self._predict(weights, window)
+            predictions = predictions.write(i, prediction)
+            window = tf.concat([window[:, 1:], prediction[:, tf.newaxis]], axis=1)
+            return i + 1, window, predictions
+
+        _, window, predictions = tf.while_loop(
+            lambda i, window, predictions: i < n_steps,
+            step,
+            [tf.constant(0), windows, predictions],
+        )
+
+        return tf.transpose(predictions.stack())
+
+    def rollout(self, models, windows, n_steps):
+        """Forecast n_steps values for each model's window, shape (n_models, n_steps)"""
+        import tensorflow as tf
+
+        exported = [stacked_export(model)[1] for model in models]
+        weights = {key: tf.constant(np.stack([model[key] for model in exported])) for key in exported[0]}
+        windows = np.asarray(windows, dtype=np.float32)
+        return self._rollout(weights, tf.constant(windows), tf.constant(n_steps, dtype=tf.int32)).numpy()
+
+
+def architecture_key(model):
+    """Get a hashable description of a model's layers and weight shapes"""
+    if is_engine(model):
+        # Models with their own runtime are never stacked with others
+        return ("engine", id(model))
+    return tuple(
+        (type(layer).__name__, tuple(tuple(weight.shape) for weight in layer.weights))
+        for layer in model.layers
+    )
+
+
+_group_engines = {}
+_group_engines_lock = threading.Lock()
+MAX_GROUP_ENGINES = 16
+
+
+def get_group_engine(models, window_size):
+    """
+    Get the group engine of models sharing an architecture, compiling it on first use
+
+    Engines are keyed on the architecture and window size, not on the
+    models, so a new combination of tickers does not trace again.
+
+    Raises:
+    ValueError: When the models have different architectures or a layer that cannot be stacked
+    """
+    exports = [stacked_export(model) for model in models]
+    layers, weights = exports[0]
+    shapes = {key: value.shape for key, value in weights.items()}
+    if any(other_layers != layers or {key: value.shape for key, value in other_weights.items()} != shapes
+           for other_layers, other_weights in exports[1:]):
+        raise ValueError("Models of a group must share their architecture")
+
+    key = (json.dumps(layers, sort_keys=True), tuple(sorted(shapes.items())), window_size)
+    with _group_engines_lock:
+        engine = _group_engines.pop(key, None)
+        if engine is None:
+            engine = GroupRolloutEngine(layers, shapes, window_size)
+        # Most recently used architectures are kept at the end
+        _group_engines[key] = engine
+        while len(_group_engines) > MAX_GROUP_ENGINES:
+            _group_engines.pop(next(iter(_group_engines)))
+        return engine
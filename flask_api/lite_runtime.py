@@ -0,0 +1,120 @@
+"""
+TensorFlow Lite runtime of the reduced-precision model variants
+
+quantize.py writes models/<ticker>/model_saham.float16.tflite and
+model_saham.int8.tflite next to model_saham.h5, and records in
+variants.json which of them passed the accuracy gate and how fast each is.
+The standalone tflite_runtime interpreter is used when it is installed,
+TensorFlow's otherwise. Variants that kept TensorFlow ops (select_tf_ops in
+variants.json) only run on TensorFlow's interpreter, they are not served
+without TensorFlow.
+"""
+import importlib.util
+import json
+import os
+import threading
+
+import numpy as np
+
+VARIANTS = ("float16", "int8")
+VARIANTS_FILE = "variants.json"
+
+
+def variant_path(model_dir, variant):
+    return os.path.join(model_dir, f"model_saham.{variant}.tflite")
+
+
+def read_variants(model_dir):
+    """Get the variants.json report of a ticker, None when quantize.py never ran for it"""
+    try:
+        with open(os.path.join(model_dir, VARIANTS_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def select_tf_ops_available():
+    """Whether TensorFlow's interpreter, the only one running TensorFlow ops, can be used"""
+    return importlib.util.find_spec("tensorflow") is not None
+
+
+def _interpreter(path, select_tf_ops=False):
+    try:
+        if select_tf_ops:
+            raise ImportError("tflite_runtime cannot run TensorFlow ops")
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+
+        Interpreter = tf.lite.Interpreter
+    return Interpreter(model_path=path)
+
+
+class LiteModel:
+    def __init__(self, path, select_tf_ops=False):
+        """
+        Window model evaluated by a TensorFlow Lite interpreter
+
+        An interpreter is not thread-safe, calls are serialized on a lock.
+        The input is resized when the batch size changes.
+
+        Parameters:
+        path (str): .tflite file written by quantize.py
+        select_tf_ops (bool): The model kept TensorFlow ops, it needs TensorFlow's interpreter
+        """
+        self.path = path
+        self._interpreter = _interpreter(path, select_tf_ops)
+        self._interpreter.allocate_tensors()
+        self._input = self._interpreter.get_input_details()[0]["index"]
+        self._output = self._interpreter.get_output_details()[0]["index"]
+        self._shape = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Load a variant, with the select_tf_ops flag recorded for it in variants.json"""
+        report = read_variants(os.path.dirname(path)) or {}
+        select_tf_ops = any(
+            variant.get("file") == os.path.basename(path) and variant.get("select_tf_ops")
+            for variant in report.get("variants", {}).values()
+        )
+        return cls(path, select_tf_ops)
+
+    def _predict(self, x):
+        if x.shape != self._shape:
+            self._interpreter.resize_tensor_input(self._input, x.shape)
+            self._interpreter.allocate_tensors()
+            self._shape = x.shape
+        self._interpreter.set_tensor(self._input, x)
+        self._interpreter.invoke()
+        return self._interpreter.get_tensor(self._output)
+
+    def __call__(self, x):
+        """Predict one value per window, x of shape (batch, window_size) or (batch, window_size, 1)"""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[:, :, np.newaxis]
+        with self._lock:
+            return self._predict(np.ascontiguousarray(x)).copy()
+
+    def rollout(self, windows, n_steps, noise=None):
+        """Same contract as inference.RolloutEngine.rollout"""
+        windows = np.asarray(windows, dtype=np.float32)
+        batch, window_size = windows.shape
+        buffer = np.empty((batch, window_size + n_steps), dtype=np.float32)
+        buffer[:, :window_size] = windows
+
+        with self._lock:
+            for step in range(n_steps):
+                x = np.ascontiguousarray(buffer[:, step:step + window_size, np.newaxis])
+                prediction = self._predict(x).reshape(batch)
+                if noise is not None:
+                    prediction = prediction + noise[:, step]
+                buffer[:, window_size + step] = prediction
+
+        return buffer[:, window_size:].copy(), buffer[:, n_steps:].copy()
+
+    def forecast(self, series, window_size, n_steps):
+        """Same contract as inference.RolloutEngine.forecast"""
+        predictions, _ = self.rollout(np.asarray(series)[np.newaxis, -window_size:], n_steps)
+        return predictions[0]
@@ -0,0 +1,176 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+import pandas as pd
+
+
+class YahooFinanceSource:
+    def __init__(self, session=None, max_workers=8, timeout=10):
+        """
+        Market data from Yahoo Finance
+
+        Parameters:
+        session: HTTP session shared by every request, yfinance's own shared session by default
+        max_workers (int): Tickers downloaded in parallel by a bulk download
+        timeout (float): Seconds before a single ticker's request is abandoned
+        """
+        self.session = session
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+    def history(self, tickers, start, end):
+        """Fetch daily bars of several tickers in one bulk download"""
+        import yfinance as yf
+
+        # Tickers are downloaded on max_workers threads, each request with its own timeout,
+        # so the bulk download takes about as long as its slowest ticker
+        data = yf.download(tickers, start=start, end=end, group_by='ticker', auto_adjust=True,
+            actions=True, progress=False, threads=max(1, min(self.max_workers, len(tickers))),
+            timeout=self.timeout, session=self.session)
+
+        result = {}
+        for ticker in tickers:
+            if isinstance(data.columns, pd.MultiIndex):
+                if ticker not in data.columns.get_level_values(0):
+                    continue
+                df = data[ticker]
+            else:
+                df = data
+            # Bulk downloads align every exchange's calendar, drop the days this ticker did not trade
+            result[ticker] = df.dropna(how='all')
+        return result
+
+    def ticker_history(self, ticker, start, end):
+        """Fetch daily bars of a single ticker"""
+        import yfinance as yf
+
+        return yf.Ticker(ticker, session=self.session).history(start=start, end=end, timeout=self.timeout)
+
+    def info(self, ticker):
+        """Fetch the fundamentals of a single ticker"""
+        import yfinance as yf
+
+        return yf.Ticker(ticker, session=self.session).info
+
+
+class LocalFixtureSource:
+    def __init__(self, directory):
+        """
+        Market data read from local files, for offline runs and tests
+
+        Expected layout: <directory>/<ticker>/history.csv (Date index and
+        OHLCV columns) and an optional <directory>/<ticker>/info.json.
+        """
+        self.directory = directory
+
+    def history(self, tickers, start, end):
+        return {ticker: self.ticker_history(ticker, start, end) for ticker in tickers}
+
+    def ticker_history(self, ticker, start, end):
+        df = pd.read_csv(os.path.join(self.directory, ticker, "history.csv"), index_col=0, parse_dates=True)
+        return df.loc[start:end]
+
+    def info(self, ticker):
+        path = os.path.join(self.directory, ticker, "info.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+
+def with_retries(fn, retries=2, backoff=0.5):
+    """Call fn, retrying with exponential backoff when it raises"""
+    for attempt in range(retries + 1):
+        try:
+            return fn()
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def fetch_all(source, tickers, start, end, max_workers=8, timeout=15, retries=2, fundamentals=True):
+    """
+    Fetch history and fundamentals of every ticker concurrently
+
+    History is downloaded in bulk when the source supports it, tickers
+    missing from the bulk result are fetched one by one. The bulk download
+    is awaited to its end, a source bounds it with per-ticker request
+    timeouts, so no ticker is ever downloaded twice. Fundamentals and
+    missing histories are fetched in parallel on a bounded thread pool,
+    each ticker with its own retries and its own timeout counted from when
+    it started, so the total time follows the slowest ticker.
+
+    Parameters:
+    source: YahooFinanceSource, LocalFixtureSource or any object with the same methods
+    tickers (list): Tickers to fetch
+    start (str): Start date in 'YYYY-MM-DD' format
+    end (str): End date in 'YYYY-MM-DD' format
+    max_workers (int): Maximum number of concurrent requests
+    timeout (float): Seconds to wait for a single ticker, retries included
+    retries (int): Retries of a failed request
+    fundamentals (bool): Also fetch the info of every ticker, left empty otherwise
+
+    Returns:
+    tuple: (history, info) dictionaries keyed by ticker
+    """
+    history, info = {}, {}
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    try:
+        bulk = pool.submit(with_retries, lambda: source.history(tickers, start, end), retries)
+        infos = {ticker: _Task(pool, lambda t=ticker: source.info(t), retries) for ticker in tickers} \
+            if fundamentals else {}
+
+        try:
+            history = bulk.result()
+        except Exception as e:
+            print(f"Bulk history download failed: {e}")
+
+        missing = {
+            ticker: _Task(pool, lambda t=ticker: source.ticker_history(t, start, end), retries)
+            for ticker in tickers if ticker not in history
+        }
+        for ticker, task in missing.items():
+            try:
+                history[ticker] = task.result(timeout)
+            except Exception as e:
+                print(f"History of {ticker} unavailable: {e!r}")
+                history[ticker] = pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'])
+
+        for ticker, task in infos.items():
+            try:
+                info[ticker] = task.result(timeout) or {}
+            except Exception as e:
+                print(f"Info of {ticker} unavailable: {e!r}")
+                info[ticker] = {}
+    finally:
+        # Do not wait for requests that already timed out
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return history, info
+
+
+class _Task:
+    def __init__(self, pool, fn, retries):
+        """Request submitted to a pool, whose timeout only runs once a worker picked it up"""
+        self.started = None
+        self._future = pool.submit(self._run, fn, retries)
+
+    def _run(self, fn, retries):
+        self.started = time.monotonic()
+        return with_retries(fn, retries)
+
+    def result(self, timeout):
+        while True:
+            started = self.started
+            # Still queued behind other tickers: wait in short steps until it starts
+            wait = 0.05 if started is None else max(0.0, started + timeout - time.monotonic())
+            try:
+                return self._future.result(timeout=wait)
+            except FuturesTimeout:
+                if started is not None:
+                    raise
@@ -0,0 +1,206 @@
+"""
+Process-local metrics in the Prometheus text format
+
+Histograms, counters and gauges are kept in memory and rendered on
+/metrics. Values owned by other objects (registry and cache counters,
+pool sizes) are read at scrape time by collectors instead of being
+mirrored. Under gunicorn every worker has its own values, the scrape
+reports the worker that answered it, labelled with its pid.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket plus +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key, counts):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+            cumulative += count
+            labels = _labels(self.labelnames + ("le",), key + (_number(float(bound)),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_number(counts[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Metrics of this process and the collectors read at scrape time"""
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        Register fn, called on every scrape
+
+        fn returns (name, kind, documentation, samples) tuples, samples
+        being (labels dict, value) pairs.
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                # A broken collector must not take the whole scrape down
+                lines.append(f"# collector {getattr(collect, '__name__', collect)} failed: {_escape(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "finsight_stage_seconds", "Duration of each stage of a request or refresh", ["endpoint", "stage"]))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "finsight_request_seconds", "Duration of HTTP requests until the response is returned", ["endpoint", "status"]))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "finsight_requests_in_flight", "HTTP requests being handled", ["endpoint"]))
+CLUSTERING_SILHOUETTE = REGISTRY.register(Gauge(
+    "finsight_clustering_silhouette", "Silhouette score of the last clustering"))
+RISKPROFILE_REFRESH_FAILURES = REGISTRY.register(Counter(
+    "finsight_riskprofile_refresh_failures_total", "Failed refreshes or loads of the risk profile clustering"))
+
+
+@REGISTRY.collector
+def process_info():
+    # Read at scrape time, a forked worker reports its own pid
+    return [("finsight_process_info", "gauge", "Process answering the scrape", [({"pid": os.getpid()}, 1)])]
+
+
+def stage(endpoint, name):
+    """Time a block as one stage, e.g. with stage("predict", "model_load"): ..."""
+    return STAGE_SECONDS.time(endpoint=endpoint, stage=name)
+
+
+def timed(endpoint, name, fn):
+    """Wrap fn so every call is timed as one stage, e.g. for work submitted to a pool"""
+    def wrapper(*args, **kwargs):
+        with stage(endpoint, name):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def render():
+    return REGISTRY.render()
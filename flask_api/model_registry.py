@@ -0,0 +1,242 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from metrics import stage
+from utils import parse_data_from_file
+
+
+class ModelEntry:
+    def __init__(self, stock, model, scaler, time, series, mtimes, version):
+        """
+        Loaded artifacts of a single ticker
+
+        Parameters:
+        stock (str): Ticker symbol
+        model (tf.keras.Model): Forecasting model
+        scaler (MinMaxScaler): Scaler fitted on the ticker's series
+        time (np.ndarray): Dates of the series
+        series (np.ndarray): Scaled series, ready for forecasting
+        mtimes (tuple): Modification times of the files the entry was loaded from
+        version (str): Content hash of the model, scaler and CSV files
+        """
+        self.stock = stock
+        self.model = model
+        self.scaler = scaler
+        self.time = time
+        self.series = series
+        self.mtimes = mtimes
+        self.version = version
+
+
+class ModelRegistry:
+    def __init__(self, base_dir=".", max_size=32, runtime="keras", global_model=None, variants=False):
+        """
+        Process-wide, size-bounded LRU of loaded ticker models
+
+        Parameters:
+        base_dir (str): Directory containing models/, scalers/ and csv/
+        max_size (int): Maximum number of tickers kept in memory
+        runtime (str): "keras" loads model_saham.h5, "numpy" loads the model_saham.npz
+        written by export_numpy.py and never imports TensorFlow
+        global_model (str): Directory of a model written by train_global.py, relative to base_dir.
+        When set, every ticker is served by that one model instead of its own model_saham.h5
+        variants (bool): Serve the variant selected by quantize.py in models/<ticker>/variants.json,
+        the fastest one that passed its accuracy gate (keras runtime only)
+        """
+        if global_model and runtime != "keras":
+            raise ValueError("The global model is served with the keras runtime only")
+        self.base_dir = base_dir
+        self.max_size = max_size
+        self.runtime = runtime
+        self.global_model = global_model
+        self._global = None
+        self.variants = variants and runtime == "keras" and not global_model
+        self._selected = {}
+        self._preloaded = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.evictions = 0
+
+    def paths(self, stock):
+        """Get the artifact paths of a ticker"""
+        if self.global_model:
+            model_path = os.path.join(self.base_dir, self.global_model, "model_global.h5")
+        else:
+            model_file = "model_saham.npz" if self.runtime == "numpy" else "model_saham.h5"
+            if self.variants:
+                model_file = self._selected_variant(stock) or model_file
+            model_path = os.path.join(self.base_dir, "models", stock, model_file)
+        return {
+            "model": model_path,
+            "scaler": os.path.join(self.base_dir, "scalers", stock, "scaler.pkl"),
+            "csv": os.path.join(self.base_dir, "csv", stock, "data_saham.csv"),
+        }
+
+    def get(self, stock):
+        """Get the entry of a ticker, loading it if missing or stale"""
+        paths = self.paths(stock)
+        mtimes = self._mtimes(paths)
+
+        entry = self._lookup(stock, mtimes)
+        if entry is not None:
+            return entry
+
+        # Only one thread loads a given ticker, the others wait for it
+        with self._load_lock(stock):
+            entry = self._lookup(stock, mtimes, count=False)
+            if entry is not None:
+                return entry
+
+            entry = self._load(stock, paths, mtimes)
+
+            with self._lock:
+                if stock in self._entries:
+                    self.reloads += 1
+                self._entries[stock] = entry
+                self._entries.move_to_end(stock)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return entry
+
+    def preload(self, stock):
+        """
+        Load a ticker ahead of the first request, e.g. in the master before workers fork
+
+        The NumPy runtime loads the whole entry. With TensorFlow only the
+        scaler and the scaled series are kept, the model is loaded by the
+        worker on its first get.
+        """
+        if self.runtime != "keras":
+            self.get(stock)
+            return
+
+        paths = self.paths(stock)
+        mtimes = self._mtimes(paths)
+        with self._load_lock(stock):
+            self._preloaded[stock] = (mtimes[1:], *self._load_series(paths))
+
+    def invalidate(self, stock=None):
+        """Drop one ticker, or every ticker when stock is None"""
+        with self._lock:
+            if stock is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(stock, None)
+
+    def stats(self):
+        """Get the registry counters"""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+            }
+
+    def _lookup(self, stock, mtimes, count=True):
+        with self._lock:
+            entry = self._entries.get(stock)
+            if entry is not None and entry.mtimes == mtimes:
+                self._entries.move_to_end(stock)
+                if count:
+                    self.hits += 1
+                return entry
+            if count:
+                self.misses += 1
+            return None
+
+    def _load_lock(self, stock):
+        with self._lock:
+            return self._load_locks.setdefault(stock, threading.Lock())
+
+    def _mtimes(self, paths):
+        return tuple(os.path.getmtime(paths[key]) for key in ("model", "scaler", "csv"))
+
+    def _load(self, stock, paths, mtimes):
+        with stage("predict", "model_load"):
+            if self.global_model:
+                model = self._load_global(paths["model"], mtimes[0]).ticker(stock)
+            else:
+                model = self._load_model(paths["model"])
+
+        # Reuse what preload parsed in the master while the scaler and CSV are unchanged
+        preloaded = self._preloaded.get(stock)
+        if preloaded is not None and preloaded[0] == mtimes[1:]:
+            _, scaler, time, series = preloaded
+        else:
+            scaler, time, series = self._load_series(paths)
+
+        return ModelEntry(stock, model, scaler, time, series, mtimes, self._version(paths))
+
+    def _load_series(self, paths):
+        import joblib
+
+        with stage("predict", "scaler_load"):
+            scaler = joblib.load(paths["scaler"])
+
+        with stage("predict", "parse_data_from_file"):
+            time, series = parse_data_from_file(paths["csv"])
+            series = scaler.fit_transform(series.reshape(-1, 1)).flatten()
+
+        return scaler, time, series
+
+    def _selected_variant(self, stock):
+        """File of the variant selected for a ticker, None for the Keras model or without a report"""
+        from lite_runtime import read_variants, select_tf_ops_available
+
+        model_dir = os.path.join(self.base_dir, "models", stock)
+        try:
+            mtime = os.path.getmtime(os.path.join(model_dir, "variants.json"))
+        except OSError:
+            return None
+
+        # The report is only read again when quantize.py rewrote it
+        cached = self._selected.get(stock)
+        if cached is None or cached[0] != mtime:
+            report = read_variants(model_dir) or {}
+            selected = report.get("variants", {}).get(report.get("selected"), {})
+            # A variant that kept TensorFlow ops cannot run on tflite_runtime alone, the .h5 is served instead
+            usable = selected.get("passed") and (not selected.get("select_tf_ops") or select_tf_ops_available())
+            cached = self._selected[stock] = (mtime, selected.get("file") if usable else None)
+        return cached[1]
+
+    def _load_model(self, path):
+        if path.endswith(".tflite"):
+            from lite_runtime import LiteModel
+
+            return LiteModel.load(path)
+        if self.runtime == "numpy":
+            from numpy_runtime import NumpyModel
+
+            return NumpyModel.load(path)
+
+        import tensorflow as tf
+
+        return tf.keras.models.load_model(path)
+
+    def _load_global(self, path, mtime):
+        """Get the global model, loaded once and shared by every ticker until its file changes"""
+        from global_model import GlobalModel
+
+        with self._load_lock("global"):
+            if self._global is None or self._global[0] != mtime:
+                self._global = (mtime, GlobalModel.load(os.path.dirname(path)))
+            return self._global[1]
+
+    def _version(self, paths):
+        digest = hashlib.sha256()
+        for key in ("model", "scaler", "csv"):
+            with open(paths[key], "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()[:16]
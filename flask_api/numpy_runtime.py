@@ -0,0 +1,137 @@
+"""
+Pure-NumPy forward pass of the window models, no TensorFlow needed at serving time
+
+The models exported by export_numpy.py are Sequential stacks of Conv1D,
+Bidirectional/plain LSTM, Dense and a constant scaling Lambda, stored as
+model_saham.npz next to model_saham.h5.
+"""
+import json
+
+import numpy as np
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x)),
+}
+
+
+def _conv1d(x, layer, weights):
+    kernel, bias = weights[f"{layer['name']}/kernel"], weights[f"{layer['name']}/bias"]
+    size, dilation = kernel.shape[0], layer["dilation_rate"]
+    if layer["padding"] == "causal":
+        x = np.pad(x, ((0, 0), ((size - 1) * dilation, 0), (0, 0)))
+    elif layer["padding"] != "valid":
+        raise ValueError(f"Unsupported Conv1D padding {layer['padding']}")
+
+    steps = x.shape[1] - (size - 1) * dilation
+    out = bias + sum(x[:, j * dilation:j * dilation + steps] @ kernel[j] for j in range(size))
+    return ACTIVATIONS[layer["activation"]](out)
+
+
+def _lstm(x, prefix, config, weights, go_backwards=False):
+    kernel = weights[f"{prefix}/kernel"]
+    recurrent = weights[f"{prefix}/recurrent_kernel"]
+    bias = weights[f"{prefix}/bias"]
+    units = recurrent.shape[0]
+    activation = ACTIVATIONS[config["activation"]]
+    recurrent_activation = ACTIVATIONS[config["recurrent_activation"]]
+
+    if go_backwards:
+        x = x[:, ::-1]
+
+    # Input projections of every timestep at once, only the recurrence is sequential
+    projected = x @ kernel + bias
+    h = np.zeros((x.shape[0], units), dtype=x.dtype)
+    c = np.zeros_like(h)
+    outputs = np.empty((x.shape[0], x.shape[1], units), dtype=x.dtype)
+
+    for t in range(x.shape[1]):
+        z = projected[:, t] + h @ recurrent
+        i = recurrent_activation(z[:, :units])
+        f = recurrent_activation(z[:, units:2 * units])
+        g = activation(z[:, 2 * units:3 * units])
+        o = recurrent_activation(z[:, 3 * units:])
+        c = f * c + i * g
+        h = o * activation(c)
+        outputs[:, t] = h
+
+    if not config["return_sequences"]:
+        return h
+    # Keras aligns the backward sequence with the forward time axis
+    return outputs[:, ::-1] if go_backwards else outputs
+
+
+def _bidirectional(x, layer, weights):
+    name = layer["name"]
+    forward = _lstm(x, f"{name}/forward", layer["forward"], weights)
+    backward = _lstm(x, f"{name}/backward", layer["backward"], weights, go_backwards=True)
+    if layer["merge_mode"] != "concat":
+        raise ValueError(f"Unsupported merge mode {layer['merge_mode']}")
+    return np.concatenate([forward, backward], axis=-1)
+
+
+def _dense(x, layer, weights):
+    out = x @ weights[f"{layer['name']}/kernel"] + weights[f"{layer['name']}/bias"]
+    return ACTIVATIONS[layer["activation"]](out)
+
+
+LAYERS = {
+    "Conv1D": _conv1d,
+    "LSTM": lambda x, layer, weights: _lstm(x, layer["name"], layer, weights),
+    "Bidirectional": _bidirectional,
+    "Dense": _dense,
+    "Scale": lambda x, layer, weights: x * np.asarray(layer["factor"], dtype=x.dtype),
+}
+
+
+class NumpyModel:
+    def __init__(self, layers, weights):
+        """
+        Window model evaluated with NumPy
+
+        Parameters:
+        layers (list): Layer configs written by export_numpy.py
+        weights (dict): Arrays keyed by '<layer name>/<weight name>'
+        """
+        self.layers = layers
+        self.weights = {key: np.asarray(value, dtype=np.float32) for key, value in weights.items()}
+
+    @classmethod
+    def load(cls, path):
+        """Load a model exported by export_numpy.py"""
+        with np.load(path) as data:
+            layers = json.loads(str(data["config"]))
+            weights = {key: data[key] for key in data.files if key != "config"}
+        return cls(layers, weights)
+
+    def __call__(self, x):
+        """Predict one value per window, x of shape (batch, window_size) or (batch, window_size, 1)"""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[:, :, np.newaxis]
+        for layer in self.layers:
+            x = LAYERS[layer["type"]](x, layer, self.weights)
+        return x
+
+    def rollout(self, windows, n_steps, noise=None):
+        """Same contract as inference.RolloutEngine.rollout"""
+        # One preallocated buffer holds the windows followed by every prediction
+        windows = np.asarray(windows, dtype=np.float32)
+        batch, window_size = windows.shape
+        buffer = np.empty((batch, window_size + n_steps), dtype=np.float32)
+        buffer[:, :window_size] = windows
+
+        for step in range(n_steps):
+            prediction = self(buffer[:, step:step + window_size]).reshape(batch)
+            if noise is not None:
+                prediction = prediction + noise[:, step]
+            buffer[:, window_size + step] = prediction
+
+        return buffer[:, window_size:].copy(), buffer[:, n_steps:].copy()
+
+    def forecast(self, series, window_size, n_steps):
+        """Same contract as inference.RolloutEngine.forecast"""
+        predictions, _ = self.rollout(np.asarray(series)[np.newaxis, -window_size:], n_steps)
+        return predictions[0]
@@ -0,0 +1,171 @@
+"""
+Materialize forecasts of every ticker into one columnar .npz file
+
+Usage:
+python3 precompute.py --years 10 --output forecasts.npz
+
+/predict answers from this file when PREDICT_MODE=precomputed and only
+falls back to live inference when a ticker is missing, its horizon is
+too short, or its artifacts changed since the file was written.
+"""
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from model_registry import ModelRegistry
+from responses import inverse_scale
+from utils import extended_forecast, get_tickers, get_window
+
+ARTIFACTS = ("model", "scaler", "csv")
+WEEK = np.timedelta64(7, "D")
+
+
+def artifact_mtimes(registry, stock):
+    """Get the modification times of a ticker's model, scaler and CSV"""
+    paths = registry.paths(stock)
+    return [os.path.getmtime(paths[key]) for key in ARTIFACTS]
+
+
+def materialize(registry, years, tickers=None):
+    """
+    Forecast every ticker up to a horizon
+
+    Parameters:
+    registry (ModelRegistry): Registry used to load the artifacts
+    years (int): Horizon in years
+    tickers (list): Tickers to forecast, all tickers of get_window by default
+
+    Returns:
+    dict: Columnar arrays, ready for np.savez
+    """
+    import pandas as pd
+
+    names, versions, mtimes, first_times, offsets, prices = [], [], [], [], [0], []
+
+    for stock in tickers or get_tickers():
+        try:
+            entry = registry.get(stock)
+        except OSError as e:
+            print(f"Skipping {stock}: {e}")
+            continue
+
+        predicted_values = extended_forecast(entry.model, entry.series, get_window(stock), forecast_steps=years)
+        predicted_actual = inverse_scale(entry.scaler, predicted_values)
+
+        # Weekly times are fully described by the first one
+        first_time = pd.date_range(start=entry.time[-1], periods=2, freq='W')[1]
+
+        names.append(stock)
+        versions.append(entry.version)
+        mtimes.append(list(entry.mtimes))
+        first_times.append(first_time.to_datetime64())
+        offsets.append(offsets[-1] + len(predicted_actual))
+        prices.append(predicted_actual)
+        print(f"{stock}: {len(predicted_actual)} weeks")
+
+    return {
+        "tickers": np.array(names),
+        "versions": np.array(versions),
+        "mtimes": np.array(mtimes, dtype=np.float64).reshape(-1, len(ARTIFACTS)),
+        "first_times": np.array(first_times, dtype="datetime64[ns]"),
+        "offsets": np.array(offsets, dtype=np.int64),
+        "prices": np.concatenate(prices) if prices else np.empty(0),
+        "years": np.array(years),
+        "generated_at": np.array(time.time()),
+    }
+
+
+def write(path, arrays):
+    """Write the arrays atomically so a serving process never reads a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+class PrecomputedForecasts:
+    def __init__(self, path, registry):
+        """
+        Read side of the materialized forecasts
+
+        The file is loaded in memory once and reloaded when it is replaced.
+
+        Parameters:
+        path (str): Path of the .npz file written by this module
+        registry (ModelRegistry): Registry whose artifact paths are checked for staleness
+        """
+        self.path = path
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._data = None
+        self._index = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, stock, n_weeks):
+        """
+        Get the first n_weeks forecasted prices and times
+
+        Returns:
+        tuple: (prices, times) arrays, or None on a miss
+        """
+        # A slice of zero or fewer weeks would count from the end of the forecast
+        if n_weeks <= 0:
+            return None
+        data, index = self._load()
+        row = index.get(stock)
+
+        if row is not None:
+            start, end = data["offsets"][row], data["offsets"][row + 1]
+            try:
+                fresh = artifact_mtimes(self.registry, stock) == data["mtimes"][row].tolist()
+            except OSError:
+                fresh = False
+
+            if fresh and end - start >= n_weeks:
+                with self._lock:
+                    self.hits += 1
+                prices = data["prices"][start:start + n_weeks]
+                times = data["first_times"][row] + WEEK * np.arange(n_weeks)
+                return prices, times
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return {}, {}
+
+        with self._lock:
+            if mtime != self._mtime:
+                with np.load(self.path) as f:
+                    self._data = {key: f[key] for key in f.files}
+                self._index = {str(stock): row for row, stock in enumerate(self._data["tickers"])}
+                self._mtime = mtime
+            return self._data, self._index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize forecasts of every ticker")
+    parser.add_argument("--years", type=int, default=10, help="Horizon in years")
+    parser.add_argument("--output", default="forecasts.npz", help="Output .npz file")
+    parser.add_argument("--base-dir", default=".", help="Directory containing models/, scalers/ and csv/")
+    parser.add_argument("--tickers", nargs="*", help="Tickers to forecast, all by default")
+    parser.add_argument("--global-model", help="Directory of the global model, as GLOBAL_MODEL_DIR")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(base_dir=args.base_dir, global_model=args.global_model)
+    arrays = materialize(registry, args.years, args.tickers)
+    write(args.output, arrays)
+    print(f"Wrote {len(arrays['tickers'])} tickers to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
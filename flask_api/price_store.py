@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from process_lock import ProcessLock
+
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+WEEKLY = ["Adj Close", "Close", "High", "Low", "Open", "Volume"]
+
+
+class PriceStore:
+    def __init__(self, root, columns=OHLCV):
+        """
+        Local columnar price history, one set of memory-mapped files per ticker
+
+        Layout: <root>/<ticker>/dates.bin (int64 nanoseconds, exchange wall
+        time), <root>/<ticker>/values.bin (float64, one column per field,
+        row-major) and <root>/<ticker>/meta.json (row count and columns).
+        Appends only write the new rows, and the row count in meta.json is
+        replaced last, so readers never see a partial append. Writers of a
+        ticker, in any process, hold the exclusive lock <root>/<ticker>.lock,
+        readers hold it shared while they read meta.json and map the files.
+
+        Parameters:
+        root (str): Directory of the store
+        columns (list): Fields stored for every bar
+        """
+        self.root = root
+        self.columns = list(columns)
+        self._lock = threading.Lock()
+        self._maps = {}
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, ticker)
+
+    def _file_lock(self, ticker, shared=False):
+        return ProcessLock(os.path.join(self.root, f"{ticker}.lock"), shared=shared, blocking=True)
+
+    def meta(self, ticker):
+        """Get the metadata of a ticker, None when it is not stored"""
+        try:
+            with open(os.path.join(self._dir(ticker), "meta.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def last_date(self, ticker):
+        """Get the date of the last stored bar, None when nothing is stored"""
+        import pandas as pd
+
+        dates, _ = self.read(ticker)
+        return pd.Timestamp(dates[-1]) if len(dates) else None
+
+    def read(self, ticker, start=None, end=None):
+        """
+        Read the bars between two dates, both inclusive
+
+        Returns:
+        tuple: (dates, values) read-only views of the memory-mapped files, no copy
+        """
+        empty = np.empty(0, dtype="datetime64[ns]"), np.empty((0, len(self.columns)))
+        if not os.path.isdir(self._dir(ticker)):
+            return empty
+
+        # A writer cannot commit between reading the row count and mapping the files it describes
+        with self._file_lock(ticker, shared=True):
+            meta = self.meta(ticker)
+            if meta is None or meta["rows"] == 0:
+                return empty
+            dates, values = self._map(ticker, meta)
+
+        i = 0 if start is None else np.searchsorted(dates, _to_ns(start), side="left")
+        j = len(dates) if end is None else np.searchsorted(dates, _to_ns(end), side="right")
+        return dates[i:j].view("datetime64[ns]"), values[i:j]
+
+    def frame(self, ticker, start=None, end=None):
+        """Read the bars between two dates as a DataFrame indexed by date"""
+        import pandas as pd
+
+        dates, values = self.read(ticker, start, end)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name="Date"), columns=self.columns, copy=False)
+
+    def append(self, ticker, df):
+        """
+        Append bars to a ticker
+
+        Bars on or before the last stored date are ignored, except the last
+        stored bar itself which is overwritten, since it may have been
+        stored before the session closed.
+        """
+        df = self._normalize(df)
+        with self._lock, self._file_lock(ticker):
+            meta = self.meta(ticker) or {"rows": 0, "columns": self.columns}
+            rows = meta["rows"]
+
+            if rows:
+                dates, _ = self._map(ticker, meta)
+                last = dates[-1]
+                new_dates = df.index.asi8
+                df = df[new_dates >= last]
+                if len(df) and df.index.asi8[0] == last:
+                    rows -= 1
+
+            if not len(df) and rows == meta["rows"]:
+                return 0
+
+            self._write(ticker, rows, df, meta)
+            return len(df)
+
+    def matches(self, ticker, df, column="Close", rtol=1e-6):
+        """
+        Whether bars overlapping the stored history agree with it
+
+        The last stored bar is left out, it may have been stored before the
+        session closed. A mismatch means the source adjusted the history
+        since it was stored, e.g. for a dividend or a split, so new bars
+        cannot be appended to it and the history has to be replaced.
+        Without overlapping bars there is nothing to compare and the bars match.
+        """
+        df = self._normalize(df)
+        dates, values = self.read(ticker)
+        _, stored, new = np.intersect1d(dates[:-1].view(np.int64), df.index.asi8, return_indices=True)
+        position = self.columns.index(column)
+        return bool(np.allclose(df.to_numpy(dtype=np.float64)[new, position], values[stored, position],
+                                rtol=rtol, atol=0, equal_nan=True))
+
+    def replace(self, ticker, df, **extra):
+        """Replace the whole history of a ticker"""
+        df = self._normalize(df)
+        with self._lock, self._file_lock(ticker):
+            meta = {"rows": 0, "columns": self.columns, **extra}
+            self._write(ticker, 0, df, meta)
+
+    def _normalize(self, df):
+        import pandas as pd
+
+        df = df.sort_index()
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            # Keep the exchange's wall time so daily bars stay on their trading day
+            index = index.tz_localize(None)
+        df = df.reindex(columns=self.columns)
+        df.index = index
+        return df[~df.index.duplicated(keep="last")]
+
+    def _write(self, ticker, rows, df, meta):
+        directory = self._dir(ticker)
+        os.makedirs(directory, exist_ok=True)
+        width = len(self.columns)
+
+        dates = df.index.asi8.astype(np.int64).tobytes()
+        values = df.to_numpy(dtype=np.float64).tobytes()
+
+        if rows == 0:
+            # New files are swapped in, so readers mapping the old ones are unaffected
+            for name, data in (("dates.bin", dates), ("values.bin", values)):
+                tmp_path = os.path.join(directory, f"{name}.{os.getpid()}.tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, os.path.join(directory, name))
+        else:
+            # Write after the committed rows, dropping anything left by an interrupted append
+            for name, data, row_size in (("dates.bin", dates, 8), ("values.bin", values, width * 8)):
+                with open(os.path.join(directory, name), "r+b") as f:
+                    f.seek(rows * row_size)
+                    f.write(data)
+                    f.truncate()
+
+        meta = {**meta, "rows": rows + len(df), "columns": self.columns}
+        tmp_path = os.path.join(directory, f"meta.json.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, os.path.join(directory, "meta.json"))
+        self._maps.pop(ticker, None)
+
+    def _map(self, ticker, meta):
+        rows = meta["rows"]
+        directory = self._dir(ticker)
+        # A replaced history has new files, so the inode is part of the cache key
+        key = (rows, os.stat(os.path.join(directory, "dates.bin")).st_ino)
+        cached = self._maps.get(ticker)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        dates = np.memmap(os.path.join(directory, "dates.bin"), dtype=np.int64, mode="r", shape=(rows,))
+        values = np.memmap(os.path.join(directory, "values.bin"), dtype=np.float64, mode="r",
+            shape=(rows, len(self.columns)))
+        self._maps[ticker] = (key, (dates, values))
+        return dates, values
+
+
+def _to_ns(date):
+    if isinstance(date, np.datetime64):
+        return date.astype("datetime64[ns]").astype(np.int64)
+    import pandas as pd
+
+    return pd.Timestamp(date).value
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(kind):
+    """
+    Get the process-wide store of a kind of data
+
+    "weekly" holds the CSVs used by /predict and "daily" the bars used by
+    /riskprofile, both under PRICE_STORE_DIR (store/ by default).
+    """
+    with _stores_lock:
+        if kind not in _stores:
+            root = os.path.join(os.environ.get("PRICE_STORE_DIR", "store"), kind)
+            _stores[kind] = PriceStore(root, WEEKLY if kind == "weekly" else OHLCV)
+        return _stores[kind]
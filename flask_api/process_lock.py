@@ -0,0 +1,42 @@
+import os
+
+
+class ProcessLock:
+    def __init__(self, path, shared=False, blocking=False):
+        """
+        File lock shared by the processes of a replica, e.g. gunicorn workers
+
+        Entering the lock gives whether it was acquired, always True when
+        blocking. Without fcntl, e.g. on Windows, every process acquires it.
+
+        Parameters:
+        path (str): Lock file, created when missing
+        shared (bool): Take a shared lock, held by any number of readers but no writer
+        blocking (bool): Wait for the lock instead of giving up
+        """
+        self.path = path
+        self.shared = shared
+        self.blocking = blocking
+        self._file = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return True
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._file = open(self.path, "a")
+        try:
+            fcntl.flock(self._file, (fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX) |
+                        (0 if self.blocking else fcntl.LOCK_NB))
+        except OSError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
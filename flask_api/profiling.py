@@ -0,0 +1,177 @@
+"""
+Opt-in profiling of single requests, written as collapsed stacks for flamegraphs
+
+A request is profiled when PROFILE_TOKEN is set on the server and the
+request carries the same token in an X-Profile header or a profile query
+parameter. The request thread and every inference pool thread working for
+it are sampled, and <PROFILE_DIR>/<id>.collapsed plus <id>.json (request
+and response metadata) are written. The collapsed file feeds flamegraph.pl
+or speedscope directly.
+
+Usage outside the server:
+python3 profiling.py predict --stock BBCA.JK --steps 10
+python3 profiling.py riskprofile --output riskprofile.collapsed
+"""
+import argparse
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+_session = contextvars.ContextVar("profile_session", default=None)
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", "?")
+    name = getattr(code, "co_qualname", code.co_name)
+    # ';' separates frames and the last ' ' separates the count in the collapsed format
+    return f"{module}.{name}:{frame.f_lineno}".replace(";", ":").replace(" ", "_")
+
+
+class SamplingProfiler:
+    def __init__(self, interval=0.005, max_depth=128):
+        """
+        Samples the stacks of the threads working for one piece of work
+
+        The thread entering the profiler is always sampled. Other threads are
+        sampled while they run work submitted from it, see
+        concurrency.BoundedExecutor which publishes the context of its tasks.
+
+        Parameters:
+        interval (float): Seconds between two samples
+        max_depth (int): Deepest frame kept per stack
+        """
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = None
+        self.duration = None
+        self._owner = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._owner = threading.get_ident()
+        _session.set(self)
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        _session.set(None)
+        self.duration = time.time() - self.started
+
+    def _targets(self):
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == self._owner:
+                yield threads.get(ident), frame
+                continue
+            context = getattr(threads.get(ident), "task_context", None)
+            if context is not None and context.get(_session) is self:
+                yield threads[ident], frame
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for thread, frame in self._targets():
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                name = thread.name if thread is not None else "thread"
+                self.stacks[";".join([name.replace(" ", "_")] + stack[::-1])] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        """Lines of 'frame;frame;frame count', root first"""
+        return [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+
+    def write(self, path):
+        with open(path, "w") as f:
+            f.write("\n".join(self.collapsed()) + "\n")
+
+
+def current():
+    """Profiler of the running request, None when it is not profiled"""
+    return _session.get()
+
+
+def authorized(token, presented):
+    """Whether a request presented the profiling token, always False when no token is configured"""
+    import hmac
+
+    return bool(token) and bool(presented) and hmac.compare_digest(str(token), str(presented))
+
+
+def save(profiler, directory, metadata):
+    """
+    Write the collapsed stacks and their metadata
+
+    Returns:
+    str: Id of the profile, the name of both files
+    """
+    os.makedirs(directory, exist_ok=True)
+    profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{threading.get_ident() % 100000}"
+    profiler.write(os.path.join(directory, f"{profile_id}.collapsed"))
+    with open(os.path.join(directory, f"{profile_id}.json"), "w") as f:
+        json.dump({
+            **metadata,
+            "samples": profiler.samples,
+            "interval": profiler.interval,
+            "started": profiler.started,
+            "duration": profiler.duration,
+            "top_frames": _top_frames(profiler),
+        }, f, indent=2, default=str)
+    return profile_id
+
+
+def _top_frames(profiler, n=15):
+    """Leaf frames holding most samples, a quick summary without a flamegraph"""
+    leaves = Counter()
+    for stack, count in profiler.stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += count
+    return leaves.most_common(n)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a forecast or a clustering refresh")
+    parser.add_argument("target", choices=["predict", "riskprofile"])
+    parser.add_argument("--stock", default="BBCA.JK", help="Ticker forecasted by the predict target")
+    parser.add_argument("--steps", type=int, default=10, help="Horizon in years of the predict target")
+    parser.add_argument("--interval", type=float, default=0.002, help="Seconds between two samples")
+    parser.add_argument("--output", help="Collapsed stacks file, <target>.collapsed by default")
+    args = parser.parse_args()
+
+    if args.target == "predict":
+        from model_registry import ModelRegistry
+        from utils import extended_forecast, get_window
+
+        entry = ModelRegistry().get(args.stock)
+
+        def work():
+            extended_forecast(entry.model, entry.series, get_window(args.stock), forecast_steps=args.steps)
+    else:
+        from risk_profile import RiskProfileService
+
+        work = RiskProfileService().refresh
+
+    with SamplingProfiler(interval=args.interval) as profiler:
+        work()
+
+    output = args.output or f"{args.target}.collapsed"
+    profiler.write(output)
+    print(f"{profiler.samples} samples over {profiler.duration:.3f}s written to {output}")
+    for frame, count in _top_frames(profiler, 10):
+        print(f"  {count:6d}  {frame}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Build reduced-precision variants of the ticker models and gate them on accuracy
+
+Usage:
+python3 quantize.py                      # every ticker of get_window
+python3 quantize.py --tickers BBCA.JK --drift-tolerance 0.5
+
+Each models/<ticker>/model_saham.h5 is converted to TensorFlow Lite twice:
+float16 weights, and int8 post-training quantization calibrated on the
+ticker's own windows (float fallback for ops without an int8 kernel). Every
+variant is compared with the Keras model on the ticker's history:
+
+- mae_increase: one-step MAE against the actual prices, relative to the Keras model's
+- forecast_error: mean absolute difference of a --years forecast, relative to the Keras forecast
+- drift: difference of the forecast's percentage_change, in percentage points
+
+A variant passes when all three are within tolerance. The fastest of the
+passing variants and the Keras model is recorded as "selected" in
+models/<ticker>/variants.json, which the registry follows when
+MODEL_VARIANTS=1.
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+import tensorflow as tf
+
+from inference import RolloutEngine
+from lite_runtime import VARIANTS, VARIANTS_FILE, LiteModel, variant_path
+from model_registry import ModelRegistry
+from responses import inverse_scale, percentage_change
+from utils import get_tickers, get_window
+
+
+def convert(model, window_size, variant, windows):
+    """
+    Convert a Keras window model to TensorFlow Lite
+
+    Parameters:
+    variant (str): "float16" or "int8"
+    windows (np.ndarray): Windows of the ticker's series, calibrate the int8 ranges
+
+    Returns:
+    tuple: The .tflite bytes and whether TensorFlow ops had to be kept (needs the full TensorFlow interpreter)
+    """
+    function = tf.function(lambda x: model(x, training=False),
+        input_signature=[tf.TensorSpec(shape=[None, window_size, 1], dtype=tf.float32)])
+
+    def converter(select_tf_ops):
+        converter = tf.lite.TFLiteConverter.from_concrete_functions([function.get_concrete_function()], model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if variant == "float16":
+            converter.target_spec.supported_types = [tf.float16]
+        elif variant == "int8":
+            samples = windows[np.linspace(0, len(windows) - 1, min(len(windows), 200)).astype(int)]
+            converter.representative_dataset = lambda: ([sample[np.newaxis, :, np.newaxis]] for sample in samples)
+        else:
+            raise ValueError(f"Unknown variant {variant}, expected one of {', '.join(VARIANTS)}")
+        if select_tf_ops:
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS, tf.lite.OpsSet.SELECT_TF_OPS]
+            converter._experimental_lower_tensor_list_ops = False
+        return converter
+
+    try:
+        return converter(False).convert(), False
+    except Exception:
+        # LSTMs that do not fuse into TFLite kernels keep their TensorFlow ops
+        return converter(True).convert(), True
+
+
+def evaluate(reference, candidate, series, window_size, scaler, weeks):
+    """
+    Compare a candidate engine with the reference on a ticker's history and forecast
+
+    Returns:
+    dict: mae_increase, forecast_error and drift, see the module docstring
+    """
+    windows = np.lib.stride_tricks.sliding_window_view(np.asarray(series, dtype=np.float32)[:-1], window_size)
+    actual = inverse_scale(scaler, series[window_size:])
+
+    reference_one, _ = reference.rollout(windows, 1)
+    candidate_one, _ = candidate.rollout(windows, 1)
+    reference_mae = np.mean(np.abs(inverse_scale(scaler, reference_one[:, 0]) - actual))
+    candidate_mae = np.mean(np.abs(inverse_scale(scaler, candidate_one[:, 0]) - actual))
+
+    reference_forecast = inverse_scale(scaler, reference.forecast(series, window_size, weeks))
+    candidate_forecast = inverse_scale(scaler, candidate.forecast(series, window_size, weeks))
+
+    return {
+        "mae_increase": float(candidate_mae / reference_mae - 1),
+        "forecast_error": float(np.mean(np.abs(candidate_forecast - reference_forecast)) /
+                                np.mean(np.abs(reference_forecast))),
+        "drift": abs(percentage_change(candidate_forecast) - percentage_change(reference_forecast)),
+    }
+
+
+def rollout_seconds(engine, series, window_size, weeks=52, repeat=5):
+    """Median duration of a weeks-long forecast, after one warm-up run"""
+    engine.forecast(series, window_size, weeks)
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        engine.forecast(series, window_size, weeks)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def quantize(entry, model_dir, window_size, tolerances, weeks, variants=VARIANTS):
+    """
+    Write the variants of one ticker and gate them
+
+    Parameters:
+    entry (ModelEntry): Ticker loaded with its Keras model
+    model_dir (str): Directory of its model_saham.h5, where the variants are written
+    tolerances (dict): Maximum mae_increase, forecast_error and drift
+    weeks (int): Horizon of the compared forecast
+
+    Returns:
+    dict: Content of the ticker's variants.json
+    """
+    series = np.asarray(entry.series, dtype=np.float32)
+    windows = np.lib.stride_tricks.sliding_window_view(series, window_size)
+    reference = RolloutEngine(entry.model)
+
+    report = {
+        "tolerances": tolerances,
+        "weeks": weeks,
+        "variants": {"keras": {"passed": True, "seconds": rollout_seconds(reference, series, window_size)}},
+    }
+
+    for variant in variants:
+        path = variant_path(model_dir, variant)
+        try:
+            content, select_tf_ops = convert(entry.model, window_size, variant, windows)
+        except Exception as e:
+            report["variants"][variant] = {"passed": False, "error": f"Conversion failed: {e}"}
+            continue
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+        try:
+            candidate = LiteModel(path, select_tf_ops=select_tf_ops)
+            errors = evaluate(reference, candidate, series, window_size, entry.scaler, weeks)
+            seconds = rollout_seconds(candidate, series, window_size)
+        except Exception as e:
+            # e.g. TensorFlow ops kept by the conversion that the interpreter cannot run
+            os.remove(path)
+            report["variants"][variant] = {"passed": False, "select_tf_ops": select_tf_ops,
+                                           "error": f"Evaluation failed: {e}"}
+            continue
+
+        report["variants"][variant] = {
+            "file": os.path.basename(path),
+            "bytes": len(content),
+            "select_tf_ops": select_tf_ops,
+            **errors,
+            "passed": all(errors[key] <= tolerances[key] for key in tolerances),
+            "seconds": seconds,
+        }
+
+    passed = {name: result for name, result in report["variants"].items() if result["passed"]}
+    report["selected"] = min(passed, key=lambda name: passed[name]["seconds"])
+
+    path = os.path.join(model_dir, VARIANTS_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(report, f, indent=2)
+    os.replace(tmp_path, path)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build float16 and int8 variants of the ticker models")
+    parser.add_argument("--tickers", nargs="*", help="Tickers to quantize, all by default")
+    parser.add_argument("--base-dir", default=".", help="Directory containing models/, scalers/ and csv/")
+    parser.add_argument("--variants", nargs="*", default=list(VARIANTS), choices=VARIANTS, help="Variants to build")
+    parser.add_argument("--years", type=int, default=5, help="Horizon of the compared forecast")
+    parser.add_argument("--mae-tolerance", type=float, default=0.05,
+                        help="Maximum relative increase of the one-step MAE on the history")
+    parser.add_argument("--forecast-tolerance", type=float, default=0.02,
+                        help="Maximum mean relative difference of the forecast")
+    parser.add_argument("--drift-tolerance", type=float, default=1.0,
+                        help="Maximum percentage_change drift, in percentage points")
+    args = parser.parse_args()
+
+    tolerances = {
+        "mae_increase": args.mae_tolerance,
+        "forecast_error": args.forecast_tolerance,
+        "drift": args.drift_tolerance,
+    }
+    registry = ModelRegistry(base_dir=args.base_dir)
+
+    for stock in args.tickers or get_tickers():
+        try:
+            entry = registry.get(stock)
+        except OSError as e:
+            print(f"Skipping {stock}: {e}")
+            continue
+
+        model_dir = os.path.dirname(registry.paths(stock)["model"])
+        report = quantize(entry, model_dir, get_window(stock), tolerances, 52 * args.years, args.variants)
+        summary = ", ".join(
+            f"{name} {'ok' if result['passed'] else 'rejected'} {result.get('seconds', float('nan')) * 1000:.1f}ms"
+            for name, result in report["variants"].items()
+        )
+        print(f"{stock}: {summary}, selected {report['selected']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,23 +9,27 @@ Original file is located at
 
 #!pip install ta
 
-import yfinance as yf
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.metrics import silhouette_score
 import ta
 from datetime import datetime, timedelta
 #import matplotlib.pyplot as plt
 #import seaborn as sns
 from sklearn.decomposition import PCA
+from feature_engine import compute_features
+from market_data import YahooFinanceSource, fetch_all
 #import plotly.express as px
 #import plotly.graph_objects as go
 #from plotly.subplots import make_subplots
 
+# Universes larger than this are clustered with MiniBatchKMeans by perform_clustering(backend="auto")
+MINIBATCH_THRESHOLD = 2000
+
 class StockClusteringSystem:
-    def __init__(self, tickers, start_date, end_date):
+    def __init__(self, tickers, start_date, end_date, data_source=None, price_store=None):
         """
         Initialize the stock clustering system
 
@@ -33,18 +37,58 @@ class StockClusteringSystem:
         tickers (list): List of stock tickers
         start_date (str): Start date in 'YYYY-MM-DD' format
         end_date (str): End date in 'YYYY-MM-DD' format
+        data_source: Market data source, Yahoo Finance by default (see market_data.py)
+        price_store (PriceStore): Local daily bars, only the missing ones are downloaded when given
         """
         self.tickers = tickers
         self.start_date = start_date
         self.end_date = end_date
+        self.data_source = data_source or YahooFinanceSource()
+        self.price_store = price_store
         self.data = {}
+        self.info = {}
         self.features = pd.DataFrame()
+        self.cluster_index = {}
+        self._recommendations = None
 
     def fetch_data(self):
-        """Fetch historical data for all tickers"""
+        """Fetch historical data and fundamentals for all tickers concurrently"""
+        if self.price_store is None:
+            self.data, self.info = fetch_all(self.data_source, self.tickers, self.start_date, self.end_date)
+            return
+
+        # Tickers whose stored history does not cover start_date are downloaded in full, the others
+        # from their last closed stored bar, which must still match to rule out a new adjustment
+        start = pd.Timestamp(self.start_date)
+        full, since = [], pd.Timestamp(self.end_date)
         for ticker in self.tickers:
-            stock = yf.Ticker(ticker)
-            self.data[ticker] = stock.history(start=self.start_date, end=self.end_date)
+            dates, _ = self.price_store.read(ticker)
+            if len(dates) < 2 or dates[0] > start + pd.Timedelta(days=7):
+                full.append(ticker)
+                since = start
+            else:
+                since = min(since, pd.Timestamp(dates[-2]))
+
+        fetched, self.info = fetch_all(self.data_source, self.tickers, since.strftime('%Y-%m-%d'), self.end_date)
+        adjusted = []
+        for ticker, df in fetched.items():
+            if ticker in full:
+                self.price_store.replace(ticker, df)
+            elif self.price_store.matches(ticker, df):
+                self.price_store.append(ticker, df)
+            else:
+                adjusted.append(ticker)
+
+        # auto_adjust=True rewrites past prices after dividends and splits, their history is downloaded again
+        if adjusted:
+            refetched, _ = fetch_all(self.data_source, adjusted, self.start_date, self.end_date, fundamentals=False)
+            for ticker, df in refetched.items():
+                if len(df):
+                    self.price_store.replace(ticker, df)
+
+        # end_date is exclusive, like in yfinance
+        end = pd.Timestamp(self.end_date) - pd.Timedelta(1, 'ns')
+        self.data = {ticker: self.price_store.frame(ticker, start, end) for ticker in self.tickers}
 
     def calculate_returns(self, ticker):
         """Calculate daily, monthly, and yearly returns"""
@@ -89,8 +133,10 @@ class StockClusteringSystem:
 
     def calculate_financial_metrics(self, ticker):
         """Calculate financial metrics for a given ticker"""
-        stock = yf.Ticker(ticker)
-        info = stock.info
+        # Fundamentals are fetched together with the history in fetch_data
+        info = self.info.get(ticker)
+        if info is None:
+            info = self.data_source.info(ticker)
 
         try:
             pe_ratio = info.get('forwardPE', 0)
@@ -107,25 +153,51 @@ class StockClusteringSystem:
             'beta': beta
         }
 
-    def create_feature_matrix(self):
-        """Create feature matrix for clustering"""
-        feature_data = []
+    def calculate_features(self, ticker):
+        """Calculate every feature of a given ticker"""
+        # Get all features
+        returns = self.calculate_returns(ticker)
+        technical = self.calculate_technical_indicators(ticker)
+        financial = self.calculate_financial_metrics(ticker)
 
-        for ticker in self.tickers:
-            # Get all features
-            returns = self.calculate_returns(ticker)
-            technical = self.calculate_technical_indicators(ticker)
-            financial = self.calculate_financial_metrics(ticker)
+        # Combine all features
+        return {
+            'ticker': ticker,
+            **returns,
+            **technical,
+            **financial
+        }
 
-            # Combine all features
-            features = {
-                'ticker': ticker,
-                **returns,
-                **technical,
-                **financial
-            }
+    def create_feature_matrix(self, reuse=None, vectorized=True):
+        """
+        Create feature matrix for clustering
 
-            feature_data.append(features)
+        Parameters:
+        reuse (pd.DataFrame): Feature rows of tickers that do not need to be recalculated
+        vectorized (bool): Compute return and technical features of all tickers at once
+        (see feature_engine.py) instead of one ticker at a time
+        """
+        pending = [t for t in self.tickers if reuse is None or t not in reuse.index]
+
+        computed = {}
+        if vectorized and pending:
+            engine_features = compute_features({t: self.data[t] for t in pending})
+            for ticker in pending:
+                computed[ticker] = {
+                    'ticker': ticker,
+                    **engine_features.loc[ticker].to_dict(),
+                    **self.calculate_financial_metrics(ticker)
+                }
+
+        feature_data = []
+
+        for ticker in self.tickers:
+            if ticker in computed:
+                feature_data.append(computed[ticker])
+            elif ticker not in pending:
+                feature_data.append({'ticker': ticker, **reuse.loc[ticker].to_dict()})
+            else:
+                feature_data.append(self.calculate_features(ticker))
 
         self.features = pd.DataFrame(feature_data)
         self.features.set_index('ticker', inplace=True)
@@ -139,20 +211,61 @@ class StockClusteringSystem:
         self.features = self.features.fillna(self.features.mean())
 
         # Scale features
-        scaler = StandardScaler()
-        self.scaled_features = scaler.fit_transform(self.features)
+        self.scaler = StandardScaler()
+        self.scaled_features = self.scaler.fit_transform(self.features)
+
+    def perform_clustering(self, n_clusters=3, backend="auto", init_centroids=None, silhouette_sample=2000,
+                           batch_size=1024):
+        """
+        Perform K-means clustering
 
-    def perform_clustering(self, n_clusters=3):
-        """Perform K-means clustering"""
-        self.kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+        Parameters:
+        n_clusters (int): Number of clusters
+        backend (str): "kmeans", "minibatch" (MiniBatchKMeans), or "auto" for MiniBatchKMeans
+        above MINIBATCH_THRESHOLD tickers
+        init_centroids (np.ndarray): Centroids of a previous run in unscaled feature units,
+        to warm start from them instead of k-means++
+        silhouette_sample (int): Maximum number of tickers the silhouette score is computed on
+        batch_size (int): Mini-batch size of MiniBatchKMeans
+        """
+        n_samples = len(self.scaled_features)
+        if backend == "auto":
+            backend = "minibatch" if n_samples > MINIBATCH_THRESHOLD else "kmeans"
+
+        # Previous centroids are scaled with this run's scaler, the features were rescaled since
+        warm_start = {}
+        if init_centroids is not None and np.shape(init_centroids) == (n_clusters, self.scaled_features.shape[1]):
+            centroids = pd.DataFrame(init_centroids, columns=self.features.columns[:self.scaled_features.shape[1]])
+            warm_start = {"init": self.scaler.transform(centroids), "n_init": 1}
+
+        if backend == "minibatch":
+            self.kmeans = MiniBatchKMeans(n_clusters=n_clusters, batch_size=batch_size, random_state=42, **warm_start)
+        elif backend == "kmeans":
+            self.kmeans = KMeans(n_clusters=n_clusters, random_state=42, **warm_start)
+        else:
+            raise ValueError(f"Unknown clustering backend {backend}")
         self.clusters = self.kmeans.fit_predict(self.scaled_features)
 
         # Add clusters back to features DataFrame
         self.features['Cluster'] = self.clusters
 
-        # Calculate silhouette score
-        silhouette_avg = silhouette_score(self.scaled_features, self.clusters)
-        print(f"Silhouette Score: {silhouette_avg}")
+        # cluster -> tickers, built once so recommendations are lookups
+        order = np.argsort(self.clusters, kind="stable")
+        tickers = self.features.index.to_numpy()[order]
+        bounds = np.flatnonzero(np.diff(self.clusters[order])) + 1
+        self.cluster_index = {
+            int(self.clusters[order[start]]): group.tolist()
+            for start, group in zip(np.concatenate([[0], bounds]), np.split(tickers, bounds))
+        }
+        self._recommendations = None
+
+        # Calculate silhouette score, on a sample for large universes since it is quadratic
+        self.silhouette = None
+        if 1 < len(self.cluster_index) < n_samples:
+            sample_size = silhouette_sample if n_samples > silhouette_sample else None
+            self.silhouette = silhouette_score(self.scaled_features, self.clusters, sample_size=sample_size,
+                random_state=42)
+        print(f"Silhouette Score: {self.silhouette}")
 
     def get_cluster_characteristics(self):
         """Get characteristics of each cluster"""
@@ -175,7 +288,8 @@ class StockClusteringSystem:
         min_score = risk_score.min()
 
         risk_mapping = {}
-        for cluster in range(len(cluster_means)):
+        # Mini-batch runs can leave a cluster empty, only the clusters present are mapped
+        for cluster in cluster_means.index:
             if risk_score[cluster] == max_score:
                 risk_mapping[cluster] = 'Aggressive'
             elif risk_score[cluster] == min_score:
@@ -192,27 +306,23 @@ class StockClusteringSystem:
 
     def get_recommendations(self, risk_preference):
         """Get stock recommendations with improved error handling"""
-        risk_mapping = self.get_cluster_characteristics()
+        if self._recommendations is None:
+            # Risk profile -> tickers, computed once per clustering
+            risk_mapping = self.get_cluster_characteristics()
+            self._recommendations = {}
+            for cluster, risk in risk_mapping.items():
+                self._recommendations.setdefault(risk, []).extend(self.cluster_index.get(cluster, []))
 
         # Check if we have any mappings
-        if not risk_mapping:
+        if not self._recommendations:
             print(f"Warning: No valid risk mappings found")
             return []
 
-        # Find clusters matching the risk preference
-        matching_clusters = [k for k, v in risk_mapping.items() if v == risk_preference]
-
-        if not matching_clusters:
+        if risk_preference not in self._recommendations:
             print(f"Warning: No clusters found for risk preference '{risk_preference}'")
             return []
 
-        # Get all stocks from matching clusters
-        recommendations = []
-        for cluster in matching_clusters:
-            cluster_stocks = self.features[self.features['Cluster'] == cluster].index.tolist()
-            recommendations.extend(cluster_stocks)
-
-        return recommendations
+        return list(self._recommendations[risk_preference])
 
 class StockVisualization:
     def __init__(self, stock_system):
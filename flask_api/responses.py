@@ -0,0 +1,194 @@
+import json
+
+import numpy as np
+
+FORMATS = ("json", "columnar", "msgpack")
+DATE_STYLES = ("http", "iso", "epoch")
+
+_WEEKDAYS = np.array([b"Mon", b"Tue", b"Wed", b"Thu", b"Fri", b"Sat", b"Sun"]).view("S1").reshape(7, 3)
+_MONTHS = np.array([b"Jan", b"Feb", b"Mar", b"Apr", b"May", b"Jun",
+                    b"Jul", b"Aug", b"Sep", b"Oct", b"Nov", b"Dec"]).view("S1").reshape(12, 3)
+
+
+def inverse_scale(scaler, values):
+    """
+    Convert scaled values back to prices without going through Python lists
+
+    Gives the same float64 prices as scaler.inverse_transform([values]) of
+    the original handler, which converts the list of float32 predictions
+    to float64 before applying the same affine map.
+
+    Parameters:
+    scaler (MinMaxScaler): Scaler fitted on the ticker's series
+    values (np.ndarray): Scaled values
+
+    Returns:
+    np.ndarray: Prices, float64
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    min_, scale = getattr(scaler, "min_", None), getattr(scaler, "scale_", None)
+    if min_ is not None and scale is not None and np.size(min_) == 1 and np.size(scale) == 1:
+        # MinMaxScaler fitted on a single column is one affine map, X = (X_scaled - min_) / scale_
+        return (values - float(np.ravel(min_)[0])) / float(np.ravel(scale)[0])
+    return np.asarray(scaler.inverse_transform([values]), dtype=np.float64).ravel()
+
+
+def http_dates(times):
+    """
+    Format times like Flask's JSON encoder does, e.g. 'Sun, 07 Jan 2024 00:00:00 GMT', in one vectorized pass
+
+    Parameters:
+    times (np.ndarray): datetime64 values, naive times are treated as UTC
+
+    Returns:
+    list: Formatted strings
+    """
+    times = np.asarray(times, dtype="datetime64[s]")
+    days = times.astype("datetime64[D]")
+    months = times.astype("datetime64[M]")
+    iso = np.datetime_as_string(times, unit="s").astype("S19").view("S1").reshape(-1, 19)
+
+    out = np.empty((len(times), 29), dtype="S1")
+    # 1970-01-01 was a Thursday
+    out[:, 0:3] = _WEEKDAYS[(days.astype(np.int64) + 3) % 7]
+    out[:, 3:5] = [b",", b" "]
+    out[:, 5:7] = iso[:, 8:10]
+    out[:, 7] = b" "
+    out[:, 8:11] = _MONTHS[months.astype(np.int64) % 12]
+    out[:, 11] = b" "
+    out[:, 12:16] = iso[:, 0:4]
+    out[:, 16] = b" "
+    out[:, 17:25] = iso[:, 11:19]
+    out[:, 25:29] = [b" ", b"G", b"M", b"T"]
+    return out.view("S29").ravel().astype(str).tolist()
+
+
+def format_dates(times, style="http"):
+    """
+    Format times for a response
+
+    Parameters:
+    times (np.ndarray): datetime64 values
+    style (str): "http" (default, same as the original responses), "iso" or "epoch" (seconds)
+
+    Returns:
+    list: Strings, or integers for epoch
+    """
+    if style == "http":
+        return http_dates(times)
+    times = np.asarray(times, dtype="datetime64[s]")
+    if style == "iso":
+        return np.datetime_as_string(times, unit="s").tolist()
+    if style == "epoch":
+        return times.astype(np.int64).tolist()
+    raise ValueError(f"Unknown date style {style}, expected one of {', '.join(DATE_STYLES)}")
+
+
+def percentage_change(prices):
+    return round(((float(prices[-1]) / float(prices[0])) - 1) * 100, 2)
+
+
+def prediction_body(prices, times, year_from, year_to, dates="http"):
+    """Body of a /predict response, as a dict for jsonify"""
+    prices = np.asarray(prices, dtype=np.float64)
+    return {
+        'status': 'success',
+        'prediction': {
+            'prices': prices.tolist(),
+            'times': format_dates(times, dates)
+        },
+        'year_from': str(year_from),
+        'year_to': str(year_to),
+        'percentage_change': percentage_change(prices)
+    }
+
+
+def columnar_body(prices, times, year_from, year_to, dates="epoch"):
+    """Flat column layout: one array per field next to the scalar fields"""
+    prices = np.asarray(prices, dtype=np.float64)
+    return {
+        'status': 'success',
+        'year_from': str(year_from),
+        'year_to': str(year_to),
+        'percentage_change': percentage_change(prices),
+        'dates': dates,
+        'prices': prices.tolist(),
+        'times': format_dates(times, dates)
+    }
+
+
+def msgpack_body(prices, times, year_from, year_to):
+    """
+    Binary columnar body: prices as little-endian float64 and times as
+    little-endian int64 epoch seconds, both raw bytes inside a MessagePack map
+    """
+    import msgpack
+
+    prices = np.asarray(prices, dtype="<f8")
+    return msgpack.packb({
+        'status': 'success',
+        'year_from': str(year_from),
+        'year_to': str(year_to),
+        'percentage_change': percentage_change(prices),
+        'prices': prices.tobytes(),
+        'times': np.asarray(times, dtype="datetime64[s]").astype("<i8").tobytes(),
+    })
+
+
+def stream_json(prices, times, year_from, year_to, dates="http", chunk_size=520):
+    """
+    Yield the JSON body of prediction_body in chunks
+
+    Keys come out in the same sorted order as Flask's jsonify, and only
+    chunk_size values are formatted at a time.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    times = np.asarray(times)
+
+    yield '{"percentage_change":%s,"prediction":{"prices":[' % json.dumps(percentage_change(prices))
+    for start in range(0, len(prices), chunk_size):
+        chunk = json.dumps(prices[start:start + chunk_size].tolist(), separators=(",", ":"))[1:-1]
+        yield chunk if start == 0 else "," + chunk
+    yield '],"times":['
+    for start in range(0, len(times), chunk_size):
+        chunk = json.dumps(format_dates(times[start:start + chunk_size], dates), separators=(",", ":"))[1:-1]
+        yield chunk if start == 0 else "," + chunk
+    yield ']},"status":"success","year_from":%s,"year_to":%s}\n' % (
+        json.dumps(str(year_from)), json.dumps(str(year_to)))
+
+
+STREAM_FORMATS = ("ndjson", "sse")
+
+
+def forecast_events(chunks, year_from, year_to, weeks, dates="http"):
+    """
+    Events of a streamed forecast: meta, one chunk per (prices, times) pair, then done
+
+    Parameters:
+    chunks (iterable): (prices, times) arrays, in order
+    weeks (int): Total number of forecasted weeks
+
+    Returns:
+    generator: (event name, payload dict) pairs
+    """
+    yield "meta", {'status': 'success', 'year_from': str(year_from), 'year_to': str(year_to), 'weeks': weeks}
+
+    first = last = None
+    start = 0
+    for prices, times in chunks:
+        prices = np.asarray(prices, dtype=np.float64)
+        if first is None:
+            first = prices[0]
+        last = prices[-1]
+        yield "chunk", {'start': start, 'prices': prices.tolist(), 'times': format_dates(times, dates)}
+        start += len(prices)
+
+    yield "done", {'status': 'success', 'percentage_change': percentage_change([first, last])}
+
+
+def encode_event(name, payload, style="ndjson"):
+    """Encode one event as an NDJSON line or a server-sent event"""
+    data = json.dumps(payload, separators=(",", ":"))
+    if style == "sse":
+        return f"event: {name}\ndata: {data}\n\n"
+    return '{"event":%s,%s\n' % (json.dumps(name), data[1:])
@@ -0,0 +1,267 @@
+"""
+Retrain every ticker's window model in parallel, without the notebooks
+
+Usage:
+python3 retrain.py                                   # every ticker of get_window, one process per core
+python3 retrain.py --tickers BBCA.JK BBRI.JK --epochs 50
+python3 retrain.py --workers 4 --threads 2 --no-install
+
+Each ticker trains in its own process, with TensorFlow capped at --threads
+intra-op threads so workers * threads does not exceed the cores. The model
+and training follow stock_model/<ticker>/Project_Capstone.ipynb: MinMax
+scaling, an 80/10/10 split in time, windows of the ticker's get_window
+size, Conv1D + two bidirectional LSTMs, Huber loss and early stopping.
+
+Every run writes versions/<version>/<ticker>/{model_saham.h5, scaler.pkl,
+metrics.json} and versions/<version>/report.json. Unless --no-install, the
+new files then replace models/<ticker>/model_saham.h5 and
+scalers/<ticker>/scaler.pkl with os.replace, so the registry only ever
+reloads complete files. A model_saham.npz of the NumPy runtime is
+re-exported, and a variants.json of quantize.py is dropped until
+quantize.py runs again, since both describe the previous model. A ticker
+whose NumPy export fails its parity check is reported as failed and not
+installed, so the served .h5 and .npz always hold the same model.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from utils import get_tickers, get_window
+
+SPLIT_TRAIN = 0.8
+SPLIT_VALID = 0.9
+BATCH_SIZE = 16
+SHUFFLE_BUFFER_SIZE = 1000
+
+
+def _init_worker(threads):
+    # Runs in every spawned worker before TensorFlow executes anything
+    import serving
+
+    serving.configure_threads(threads, 1, runtime="keras")
+
+
+def create_model():
+    """Window model of the notebook, compiled"""
+    import tensorflow as tf
+
+    # The series is already scaled to [0, 1], the notebook's x * 200 Lambda is left out
+    # so the .h5 loads without unsafe deserialization
+    model = tf.keras.models.Sequential([
+        tf.keras.Input(shape=(None, 1)),
+        tf.keras.layers.Conv1D(filters=64, kernel_size=3, activation='relu', padding='causal'),
+        tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(units=64, return_sequences=True)),
+        tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(units=64)),
+        tf.keras.layers.Dense(1),
+    ])
+    model.compile(loss='huber', optimizer='adam', metrics=["mae", "mse"])
+    return model
+
+
+def windowed_dataset(series, window_size, shuffle=True):
+    """Windows of window_size values and the value following each, as in the notebook"""
+    import tensorflow as tf
+
+    windows = np.lib.stride_tricks.sliding_window_view(np.asarray(series, dtype=np.float32), window_size + 1)
+    dataset = tf.data.Dataset.from_tensor_slices((windows[:, :-1, np.newaxis], windows[:, -1]))
+    if shuffle:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER_SIZE)
+    return dataset.batch(BATCH_SIZE).prefetch(1)
+
+
+def train_ticker(stock, base_dir, version_dir, epochs=100, patience=10, seed=42):
+    """
+    Train one ticker and write its artifacts under version_dir/<ticker>
+
+    Runs in a worker process.
+
+    Returns:
+    dict: Training time, epochs and validation/test metrics of the ticker
+    """
+    import joblib
+    import tensorflow as tf
+    from sklearn.preprocessing import MinMaxScaler
+
+    from utils import read_price_csv
+
+    start = time.perf_counter()
+    tf.keras.utils.set_random_seed(seed)
+    window_size = get_window(stock)
+
+    data = read_price_csv(os.path.join(base_dir, "csv", stock, "data_saham.csv"))
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    series = scaler.fit_transform(data['Adj Close'].to_numpy().reshape(-1, 1)).flatten()
+
+    split_train, split_valid = int(len(series) * SPLIT_TRAIN), int(len(series) * SPLIT_VALID)
+    if split_valid - split_train <= window_size or len(series) - split_valid <= window_size:
+        raise ValueError(f"{len(series)} weeks are too few for a window of {window_size}")
+    train_dataset = windowed_dataset(series[:split_train], window_size)
+    valid_dataset = windowed_dataset(series[split_train:split_valid], window_size, shuffle=False)
+    test_dataset = windowed_dataset(series[split_valid:], window_size, shuffle=False)
+
+    model = create_model()
+    early_stopping = tf.keras.callbacks.EarlyStopping(patience=patience, restore_best_weights=True)
+    history = model.fit(train_dataset, validation_data=valid_dataset, epochs=epochs,
+                        callbacks=[early_stopping], verbose=0)
+    train_seconds = time.perf_counter() - start
+
+    _, val_mae, val_mse = model.evaluate(valid_dataset, verbose=0)
+    _, test_mae, test_mse = model.evaluate(test_dataset, verbose=0)
+
+    output = os.path.join(version_dir, stock)
+    os.makedirs(output, exist_ok=True)
+    model.save(os.path.join(output, "model_saham.h5"))
+    joblib.dump(scaler, os.path.join(output, "scaler.pkl"))
+
+    metrics = {
+        "stock": stock,
+        "window_size": window_size,
+        "weeks": len(series),
+        "epochs": len(history.history["loss"]),
+        "train_seconds": round(train_seconds, 3),
+        "val_mae": float(val_mae),
+        "val_mse": float(val_mse),
+        "test_mae": float(test_mae),
+        "test_mse": float(test_mse),
+    }
+
+    # Keep the NumPy runtime in step with the new model when it is used
+    if os.path.exists(os.path.join(base_dir, "models", stock, "model_saham.npz")):
+        metrics["numpy_export"] = numpy_export(model, series, window_size, output)
+
+    with open(os.path.join(output, "metrics.json"), "w") as f:
+        json.dump(metrics, f, indent=2)
+    return metrics
+
+
+def numpy_export(model, series, window_size, output, tolerance=1e-4):
+    """Export the model to the NumPy runtime, only written when it matches Keras"""
+    import export_numpy
+    from numpy_runtime import NumpyModel
+
+    layers, weights = export_numpy.export(model)
+    diff = export_numpy.check(model, NumpyModel(layers, weights), series, window_size, 52)
+    if max(diff.values()) > tolerance:
+        return {"exported": False, **diff}
+    export_numpy.save(os.path.join(output, "model_saham.npz"), layers, weights)
+    return {"exported": True, **diff}
+
+
+def install(base_dir, version_dir, stock):
+    """Swap a trained ticker's files into models/, scalers/ and the NumPy export, one os.replace each"""
+    source = os.path.join(version_dir, stock)
+    targets = [
+        ("model_saham.h5", os.path.join(base_dir, "models", stock, "model_saham.h5")),
+        ("model_saham.npz", os.path.join(base_dir, "models", stock, "model_saham.npz")),
+        ("scaler.pkl", os.path.join(base_dir, "scalers", stock, "scaler.pkl")),
+    ]
+    for name, path in targets:
+        if not os.path.exists(os.path.join(source, name)):
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(os.path.join(source, name), tmp_path)
+        os.replace(tmp_path, path)
+
+    # Variants were gated against the previous model, the registry falls back to model_saham.h5
+    variants = os.path.join(base_dir, "models", stock, "variants.json")
+    if os.path.exists(variants):
+        os.remove(variants)
+
+
+def retrain(tickers, base_dir=".", version=None, workers=None, threads=1, epochs=100, patience=10,
+            seed=42, install_models=True):
+    """
+    Train every ticker in a pool of processes
+
+    Parameters:
+    tickers (list): Tickers to train
+    version (str): Name of the run under versions/, a timestamp by default
+    workers (int): Worker processes, the number of cores divided by threads by default
+    threads (int): TensorFlow intra-op threads per worker
+    install_models (bool): Swap the new artifacts into the serving layout
+
+    Returns:
+    dict: Per-ticker metrics, failures and the wall-clock time of the run
+    """
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    version_dir = os.path.join(base_dir, "versions", version)
+    os.makedirs(version_dir, exist_ok=True)
+    workers = workers or max(1, (os.cpu_count() or 1) // threads)
+
+    start = time.perf_counter()
+    report = {"version": version, "workers": workers, "threads": threads, "tickers": {}, "failed": {}}
+
+    # Spawned workers start without the parent's TensorFlow state, so the thread caps apply
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(threads,)) as pool:
+        futures = {
+            pool.submit(train_ticker, stock, base_dir, version_dir, epochs, patience, seed): stock
+            for stock in tickers
+        }
+        for future in as_completed(futures):
+            stock = futures[future]
+            try:
+                metrics = future.result()
+            except Exception as e:
+                report["failed"][stock] = str(e)
+                print(f"{stock}: failed, {e}")
+                continue
+
+            export = metrics.get("numpy_export")
+            if export is not None and not export["exported"]:
+                # Installing would leave the previous model in model_saham.npz next to the new .h5
+                report["failed"][stock] = f"NumPy export failed parity: {export}"
+                print(f"{stock}: trained but not installed, NumPy export failed parity {export}")
+                continue
+
+            if install_models:
+                install(base_dir, version_dir, stock)
+            report["tickers"][stock] = metrics
+            print(f"{stock}: {metrics['epochs']} epochs in {metrics['train_seconds']:.1f}s, "
+                  f"val_mae {metrics['val_mae']:.4f}, test_mae {metrics['test_mae']:.4f}")
+
+    report["wall_seconds"] = round(time.perf_counter() - start, 3)
+    report["train_seconds"] = round(sum(m["train_seconds"] for m in report["tickers"].values()), 3)
+    report["installed"] = install_models
+
+    with open(os.path.join(version_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrain every ticker's window model in parallel")
+    parser.add_argument("--tickers", nargs="*", help="Tickers to train, all by default")
+    parser.add_argument("--base-dir", default=".", help="Directory containing models/, scalers/ and csv/")
+    parser.add_argument("--version", help="Name of the run under versions/, a timestamp by default")
+    parser.add_argument("--workers", type=int, help="Worker processes, cores / threads by default")
+    parser.add_argument("--threads", type=int, default=1, help="TensorFlow intra-op threads per worker")
+    parser.add_argument("--epochs", type=int, default=100, help="Maximum number of epochs")
+    parser.add_argument("--patience", type=int, default=10, help="Early stopping patience")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the weights and the shuffling")
+    parser.add_argument("--no-install", action="store_true", help="Only write versions/<version>")
+    args = parser.parse_args()
+
+    tickers = args.tickers or [
+        stock for stock in get_tickers()
+        if os.path.exists(os.path.join(args.base_dir, "csv", stock, "data_saham.csv"))
+    ]
+    report = retrain(tickers, args.base_dir, args.version, args.workers, args.threads, args.epochs,
+                     args.patience, args.seed, install_models=not args.no_install)
+    print(f"{len(report['tickers'])} tickers trained in {report['wall_seconds']:.1f}s wall, "
+          f"{report['train_seconds']:.1f}s of training, {len(report['failed'])} failed, "
+          f"written to versions/{report['version']}")
+    if report["failed"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
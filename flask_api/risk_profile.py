@@ -0,0 +1,225 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+
+from metrics import CLUSTERING_SILHOUETTE, RISKPROFILE_REFRESH_FAILURES, stage
+from price_store import get_store
+from process_lock import ProcessLock
+
+logger = logging.getLogger(__name__)
+
+TICKERS = ["^GSPC", "ADRO.JK", "ANTM.JK", "ASII.JK", "BBCA.JK", "BBNI.JK", "BBRI.JK", "BMRI.JK", "CTRA.JK", "GC=F", "GGRM.JK", "IDR=X", "INDF.JK", "INDY.JK", "LPKR.JK", "MYOR.JK", "PWON.JK", "UNVR.JK"]
+RISK_LEVELS = ["Conservative", "Moderate", "Aggressive"]
+
+
+class ClusteringSnapshot:
+    def __init__(self, system, signatures, raw_features):
+        """
+        Immutable result of one clustering run
+
+        Parameters:
+        system (StockClusteringSystem): System after perform_clustering
+        signatures (dict): Per-ticker signature of the price data the features were computed from
+        raw_features (pd.DataFrame): Feature matrix before preprocessing, reused by the next refresh
+        """
+        self.features = system.features
+        self.scaler = system.scaler
+        self.kmeans = system.kmeans
+        # Centroids in unscaled feature units, the next refresh warm starts from them
+        self.centroids = system.scaler.inverse_transform(system.kmeans.cluster_centers_)
+        self.silhouette = system.silhouette
+        self.risk_mapping = system.get_cluster_characteristics()
+        self.recommendations = {risk: system.get_recommendations(risk) for risk in RISK_LEVELS}
+        self.signatures = signatures
+        self.raw_features = raw_features
+        self.refreshed_at = time.time()
+
+
+class RiskProfileService:
+    def __init__(self, tickers=None, interval=3600, history_days=365 * 2, n_clusters=3, backend="auto",
+                 state_dir=None, poll_interval=10):
+        """
+        Keeps the clustering state in memory and refreshes it in the background
+
+        With a state_dir, the processes of a replica (gunicorn workers) share
+        one refresher: the process holding the lock in state_dir refreshes
+        when the published snapshot is older than interval and publishes the
+        new one there, the others load it every poll_interval seconds.
+
+        Parameters:
+        tickers (list): Tickers to cluster
+        interval (float): Seconds between two refreshes
+        history_days (int): Days of price history used for the features
+        n_clusters (int): Number of K-Means clusters
+        backend (str): Clustering backend, see StockClusteringSystem.perform_clustering
+        state_dir (str): Directory shared by the processes refreshing the same tickers, None to refresh alone
+        poll_interval (float): Seconds between two checks for a published snapshot
+        """
+        self.tickers = tickers or TICKERS
+        self.interval = interval
+        self.history_days = history_days
+        self.n_clusters = n_clusters
+        self.backend = backend
+        self.state_dir = state_dir
+        self.poll_interval = poll_interval
+        self.failures = 0
+        self._published = None
+        self._snapshot = None
+        self._ready = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start the background refresher, once"""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="riskprofile-refresher", daemon=True)
+                self._thread.start()
+
+    def snapshot(self, timeout=None):
+        """Get the current snapshot, waiting up to timeout seconds for the first refresh"""
+        self.start()
+        self._ready.wait(timeout)
+        return self._snapshot
+
+    def snapshot_age(self):
+        """Get the seconds since the served snapshot was computed, None before the first one"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        return time.time() - snapshot.refreshed_at
+
+    def recommendations(self, risk_preference, timeout=None):
+        """
+        Get the tickers of a risk profile
+
+        Returns:
+        list: Recommended tickers, or None when no clustering is available yet
+        """
+        snapshot = self.snapshot(timeout)
+        if snapshot is None:
+            return None
+        return snapshot.recommendations.get(risk_preference, [])
+
+    def refresh(self):
+        """Recompute the clustering state, recalculating features of changed tickers only"""
+        # sklearn, ta and yfinance are only needed here, keep them off the startup path
+        from recommendation_k_means import StockClusteringSystem
+
+        with self._refresh_lock:
+            previous = self._snapshot
+
+            end_date = datetime.now()
+            start_date = end_date - timedelta(days=self.history_days)
+            system = StockClusteringSystem(self.tickers, start_date.strftime('%Y-%m-%d'),
+                end_date.strftime('%Y-%m-%d'), price_store=get_store("daily"))
+            with stage("riskprofile", "fetch"):
+                system.fetch_data()
+
+            # Fundamentals are part of the signature, new ones are clustered even when prices did not move
+            signatures = {
+                ticker: (self._signature(system.data[ticker]),
+                         tuple(sorted(system.calculate_financial_metrics(ticker).items())))
+                for ticker in self.tickers
+            }
+            reuse = None
+            if previous is not None:
+                if signatures == previous.signatures:
+                    return previous
+                unchanged = [t for t in self.tickers if previous.signatures.get(t) == signatures[t]]
+                reuse = previous.raw_features.loc[previous.raw_features.index.intersection(unchanged)]
+
+            with stage("riskprofile", "feature_matrix"):
+                system.create_feature_matrix(reuse=reuse)
+            raw_features = system.features.copy()
+            with stage("riskprofile", "preprocess"):
+                system.preprocess_features()
+            init_centroids = None
+            if previous is not None and list(previous.raw_features.columns) == list(raw_features.columns):
+                init_centroids = previous.centroids
+            with stage("riskprofile", "clustering"):
+                system.perform_clustering(n_clusters=self.n_clusters, backend=self.backend,
+                    init_centroids=init_centroids)
+            if system.silhouette is not None:
+                CLUSTERING_SILHOUETTE.set(system.silhouette)
+
+            # Readers only ever see a complete snapshot
+            self._snapshot = ClusteringSnapshot(system, signatures, raw_features)
+            self._ready.set()
+            return self._snapshot
+
+    def _signature(self, df):
+        if df is None or df.empty:
+            return (0, None, None, None)
+        return (len(df), str(df.index[0]), str(df.index[-1]), float(df['Close'].iloc[-1]))
+
+    def sync(self):
+        """
+        Refresh or load the shared snapshot, see state_dir
+
+        Returns:
+        ClusteringSnapshot: The current snapshot, None until the first one is available
+        """
+        if self.state_dir is None:
+            return self.refresh()
+
+        with ProcessLock(self._state_path("lock")) as acquired:
+            last = max(self._mtime("snapshot.pkl") or 0, self._mtime("attempted") or 0)
+            if acquired and time.time() - last >= self.interval:
+                # Recorded first, a failing refresh is retried after interval, not on every poll
+                with open(self._state_path("attempted"), "w"):
+                    pass
+                self._publish(self.refresh())
+                return self._snapshot
+
+        self._load_published()
+        return self._snapshot
+
+    def _state_path(self, name):
+        return os.path.join(self.state_dir, name)
+
+    def _mtime(self, name):
+        try:
+            return os.path.getmtime(self._state_path(name))
+        except OSError:
+            return None
+
+    def _publish(self, snapshot):
+        path = self._state_path("snapshot.pkl")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._published = os.stat(path).st_mtime_ns
+
+    def _load_published(self):
+        """Load the snapshot published by another process, when it changed since the last load"""
+        path = self._state_path("snapshot.pkl")
+        try:
+            with open(path, "rb") as f:
+                published = os.fstat(f.fileno()).st_mtime_ns
+                if published == self._published:
+                    return
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return
+
+        with self._refresh_lock:
+            self._snapshot = snapshot
+            self._published = published
+            self._ready.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.sync()
+            except Exception:
+                # Keep serving the previous snapshot
+                self.failures += 1
+                RISKPROFILE_REFRESH_FAILURES.inc()
+                logger.exception("Risk profile refresh failed")
+            time.sleep(self.interval if self.state_dir is None else self.poll_interval)
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+_ready = threading.Event()
+_warm_up = {}
+
+
+def configure_threads(intra_op=None, inter_op=None, runtime="keras"):
+    """
+    Pin TensorFlow's and the BLAS libraries' thread pools
+
+    Must run before TensorFlow executes anything in this process, i.e. in
+    a worker right after the fork. With the NumPy runtime TensorFlow is
+    never imported. BLAS already read OMP_NUM_THREADS when numpy was
+    imported, its pools are resized with threadpoolctl instead.
+    """
+    if intra_op:
+        os.environ["OMP_NUM_THREADS"] = str(intra_op)
+        try:
+            from threadpoolctl import threadpool_limits
+        except ImportError:
+            pass
+        else:
+            threadpool_limits(intra_op)
+    if runtime != "keras":
+        return
+
+    import tensorflow as tf
+
+    if intra_op:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op)
+    if inter_op:
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op)
+
+
+def preload(registry, tickers):
+    """
+    Load everything that is safe to share between forked workers
+
+    Heavy imports and every ticker's registry entry are kept in the
+    master, so workers inherit them copy-on-write. With TensorFlow the
+    entries hold the scaler and the parsed series only, its runtime is not
+    started here since its thread pools do not survive a fork.
+    """
+    import pandas  # noqa: F401
+    import sklearn  # noqa: F401
+
+    if registry.runtime == "keras":
+        import tensorflow  # noqa: F401
+
+    for stock in tickers:
+        paths = registry.paths(stock)
+        if not all(os.path.exists(path) for path in paths.values()):
+            continue
+        registry.preload(stock)
+
+
+def warm_up(registry, tickers):
+    """Load every ticker's model and compile its rollout, then report ready"""
+    from utils import extended_forecast, get_window
+
+    start = time.perf_counter()
+    loaded = []
+    for stock in tickers:
+        paths = registry.paths(stock)
+        if not all(os.path.exists(path) for path in paths.values()):
+            continue
+        entry = registry.get(stock)
+        extended_forecast(entry.model, entry.series, get_window(stock), forecast_steps=1)
+        loaded.append(stock)
+
+    _warm_up.update({"tickers": loaded, "seconds": round(time.perf_counter() - start, 3)})
+    _ready.set()
+
+
+def warm_up_in_background(registry, tickers):
+    """Warm up without blocking, e.g. under the development server"""
+    thread = threading.Thread(target=warm_up, args=(registry, tickers), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness():
+    """Get whether this worker finished warming up, with its warm-up details"""
+    return _ready.is_set(), dict(_warm_up)
@@ -0,0 +1,126 @@
+"""
+Cold start profile of the Flask service
+
+Usage:
+python3 startup_profile.py
+python3 startup_profile.py --top 30 --stock BBCA.JK --output startup.json
+FORECAST_RUNTIME=numpy python3 startup_profile.py
+
+Every measurement runs in a fresh interpreter, so nothing is already
+imported. Import times come from `python -X importtime`, the first request
+is a POST /predict served by Flask's test client right after `import
+index`, and must succeed.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_TIME = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+FIRST_REQUEST = """
+import json, sys, time
+start = time.perf_counter()
+import index
+imported = time.perf_counter()
+response = index.app.test_client().post("/predict", json={"stock": sys.argv[1], "steps": int(sys.argv[2])})
+served = time.perf_counter()
+if response.status_code != 200:
+    sys.exit(f"/predict answered {response.status_code}: {response.get_data(as_text=True)[:500]}")
+print(json.dumps({
+    "import_seconds": round(imported - start, 4),
+    "first_request_seconds": round(served - imported, 4),
+    "total_seconds": round(served - start, 4),
+    "status": response.status_code,
+    "modules": sorted(set(name.split(".")[0] for name in sys.modules)),
+}))
+"""
+
+
+def import_times(module="index"):
+    """
+    Import a module in a fresh interpreter and collect the time spent per imported module
+
+    Returns:
+    list: One dict per module with its self and cumulative import time in seconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            modules.append({
+                "module": match.group(4),
+                "self": int(match.group(1)) / 1e6,
+                "cumulative": int(match.group(2)) / 1e6,
+                # importtime indents nested imports by two spaces per level
+                "depth": len(match.group(3)) // 2,
+            })
+    return modules
+
+
+def by_package(modules):
+    """Sum the self import time of every top-level package, slowest first"""
+    totals = {}
+    for module in modules:
+        package = module["module"].split(".")[0]
+        totals[package] = totals.get(package, 0.0) + module["self"]
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def first_request(stock, steps):
+    """
+    Time `import index` and the first POST /predict in a fresh interpreter
+
+    The profile is aborted unless the request succeeds, so the time always
+    includes loading the model and running the forecast.
+    """
+    result = subprocess.run([sys.executable, "-c", FIRST_REQUEST, stock, str(steps)],
+        cwd=BASE_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"First request failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile the cold start of the Flask service")
+    parser.add_argument("--module", default="index", help="Module imported at startup")
+    parser.add_argument("--top", type=int, default=20, help="Number of packages listed")
+    parser.add_argument("--stock", default="BBCA.JK", help="Ticker of the first /predict request")
+    parser.add_argument("--steps", type=int, default=1, help="Horizon of the first /predict request")
+    parser.add_argument("--output", help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    modules = import_times(args.module)
+    packages = by_package(modules)
+    total = sum(module["cumulative"] for module in modules if module["depth"] == 0)
+
+    print(f"import {args.module}: {total:.3f}s over {len(modules)} modules")
+    for package, seconds in packages[:args.top]:
+        print(f"  {package:<32} {seconds:8.3f}s")
+
+    request = first_request(args.stock, args.steps)
+    print(f"First request: {request['first_request_seconds']:.3f}s after import "
+          f"(status {request['status']}), {request['total_seconds']:.3f}s from a cold interpreter")
+
+    heavy = [name for name in ("tensorflow", "pandas", "sklearn", "yfinance", "ta", "google") if name in request["modules"]]
+    print(f"Heavy packages loaded by the first request: {', '.join(heavy) or 'none'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"import_seconds": total, "packages": packages, "modules": modules,
+                       "first_request": request}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
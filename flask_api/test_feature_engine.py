@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from feature_engine import align_prices, compare_with_reference, compute_features
+from recommendation_k_means import StockClusteringSystem
+
+
+def _bars(index, seed):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, len(index))))
+    return pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+                         "Volume": rng.integers(1e5, 1e7, len(index)).astype(float)}, index=index)
+
+
+def _mixed_calendars():
+    # IDX, US, FX and futures trade on different days and start at different dates
+    return {
+        "BBCA.JK": _bars(pd.bdate_range("2022-01-03", "2024-12-31", tz="Asia/Jakarta"), 0),
+        "^GSPC": _bars(pd.bdate_range("2022-01-03", "2024-12-31", tz="America/New_York"), 1),
+        "IDR=X": _bars(pd.date_range("2022-06-01", "2024-12-31", freq="D", tz="Europe/London"), 2),
+        "GC=F": _bars(pd.bdate_range("2023-03-01", "2024-12-31", tz="America/New_York")[::2], 3),
+    }
+
+
+def test_align_prices_unequal_lengths():
+    data = _mixed_calendars()
+    _, by_position = align_prices(data)
+
+    assert list(by_position.columns) == list(data)
+    assert len(by_position) == max(len(df) for df in data.values())
+    for ticker, df in data.items():
+        column = by_position[ticker]
+        np.testing.assert_array_equal(column.to_numpy()[:len(df)], df["Close"].to_numpy())
+        assert column.iloc[len(df):].isna().all()
+
+
+def test_compute_features_matches_per_ticker_path():
+    data = _mixed_calendars()
+    system = StockClusteringSystem(list(data), "2022-01-01", "2025-01-01")
+    system.data = data
+
+    assert compare_with_reference(system).empty
+    assert list(compute_features(data).index) == list(data)
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+from utils import extended_forecast, extended_forecast_chunks, extended_forecast_eager
+
+
+def _model():
+    tf.keras.utils.set_random_seed(0)
+    return tf.keras.models.Sequential([
+        tf.keras.Input(shape=(None, 1)),
+        tf.keras.layers.Conv1D(filters=8, kernel_size=3, activation='relu', padding='causal'),
+        tf.keras.layers.LSTM(units=8),
+        tf.keras.layers.Dense(1),
+    ])
+
+
+@pytest.mark.parametrize("window_size", [4, 104])
+def test_compiled_rollout_matches_eager(window_size):
+    model = _model()
+    series = np.random.default_rng(window_size).uniform(0, 1, window_size + 20).astype(np.float32)
+
+    expected = extended_forecast_eager(model, series, window_size, forecast_steps=1)
+    compiled = extended_forecast(model, series, window_size, forecast_steps=1)
+    assert compiled.shape == (52,)
+    np.testing.assert_allclose(compiled, expected, rtol=0, atol=1e-5)
+
+    # Chunks that do not divide the horizon, and one chunk per week
+    for chunk_size in (5, 1):
+        chunks = list(extended_forecast_chunks(model, series, window_size, 1, chunk_size))
+        assert all(len(chunk) <= chunk_size for chunk in chunks)
+        np.testing.assert_allclose(np.concatenate(chunks), compiled, rtol=0, atol=1e-6)
+        np.testing.assert_allclose(np.concatenate(chunks), expected, rtol=0, atol=1e-5)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+
+import export_numpy
+from inference import RolloutEngine
+from numpy_runtime import NumpyModel
+
+WINDOW_SIZE = 8
+
+
+def _model():
+    # Same layers as the notebook models, with a scaling Lambda that keeps outputs in the [0, 1] range
+    # of the registry's scaled series, where float32 differences stay far below the tolerance
+    tf.keras.utils.set_random_seed(0)
+    return tf.keras.models.Sequential([
+        tf.keras.Input(shape=(None, 1)),
+        tf.keras.layers.Conv1D(filters=16, kernel_size=3, activation='relu', padding='causal'),
+        tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(units=16, return_sequences=True)),
+        tf.keras.layers.Bidirectional(tf.keras.layers.LSTM(units=16)),
+        tf.keras.layers.Dense(1),
+        tf.keras.layers.Lambda(lambda x: x * 2.0),
+    ])
+
+
+def test_single_step_matches_keras():
+    model = _model()
+    numpy_model = NumpyModel(*export_numpy.export(model))
+    windows = np.random.default_rng(0).uniform(0, 1, (16, WINDOW_SIZE)).astype(np.float32)
+
+    expected = model(windows[:, :, np.newaxis], training=False).numpy()
+    np.testing.assert_allclose(numpy_model(windows), expected, rtol=0, atol=1e-6)
+
+
+def test_rollout_matches_keras():
+    model = _model()
+    numpy_model = NumpyModel(*export_numpy.export(model))
+    series = np.random.default_rng(1).uniform(0, 1, 64).astype(np.float32)
+
+    expected = RolloutEngine(model).forecast(series, WINDOW_SIZE, 52)
+    np.testing.assert_allclose(numpy_model.forecast(series, WINDOW_SIZE, 52), expected, rtol=0, atol=1e-6)
+
+
+def test_export_roundtrip(tmp_path):
+    model = _model()
+    path = str(tmp_path / "model_saham.npz")
+    export_numpy.save(path, *export_numpy.export(model))
+
+    series = np.random.default_rng(2).uniform(0, 1, 64).astype(np.float32)
+    diff = export_numpy.check(model, NumpyModel.load(path), series, WINDOW_SIZE, 52)
+    assert max(diff.values()) <= 1e-6
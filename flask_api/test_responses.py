@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify
+from sklearn.preprocessing import MinMaxScaler
+
+from responses import inverse_scale, prediction_body, stream_json
+
+
+def _baseline_body(scaler, predicted_values, future_time, year_from, year_to):
+    # Response of the original /predict handler
+    predicted_actual = scaler.inverse_transform([predicted_values]).flatten().tolist()
+    return {
+        'status': 'success',
+        'prediction': {
+            'prices': predicted_actual,
+            'times': future_time.tolist()
+        },
+        'year_from': str(year_from),
+        'year_to': str(year_to),
+        'percentage_change': round(((predicted_actual[-1] / predicted_actual[0]) - 1) * 100, 2)
+    }
+
+
+def test_default_body_is_byte_identical():
+    rng = np.random.default_rng(0)
+    app = Flask(__name__)
+
+    for _ in range(20):
+        scaler = MinMaxScaler().fit(rng.uniform(rng.uniform(1, 100), rng.uniform(1000, 50000), (300, 1)))
+        # Model predictions are float32
+        predicted_values = rng.uniform(-0.1, 1.2, 104).astype(np.float32)
+        future_time = pd.date_range(start="2024-12-29", periods=105, freq='W')[1:]
+
+        with app.app_context():
+            expected = jsonify(_baseline_body(scaler, predicted_values, future_time, 2024, 2026)).get_data()
+            prices = inverse_scale(scaler, predicted_values)
+            body = jsonify(prediction_body(prices, future_time.values, 2024, 2026)).get_data()
+
+        assert body == expected
+        assert "".join(stream_json(prices, future_time.values, 2024, 2026)).encode() == expected
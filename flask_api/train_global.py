@@ -0,0 +1,195 @@
+"""
+Train the global multi-ticker model and compare it with the per-ticker models
+
+Usage:
+python3 train_global.py                          # every ticker of get_window, written to models/global
+python3 train_global.py --epochs 50 --tickers BBCA.JK BBRI.JK
+python3 train_global.py --compare-only           # evaluate an existing models/global
+
+Every ticker's series is scaled like the registry does, then split 80/10/10
+in time like the per-ticker notebook. Windows of every ticker (its own
+window size, left-padded) are trained together. The comparison runs both
+models on each ticker's test split: one-step MAE/RMSE, and the MAE of a
+recursive rollout over the whole split, all in scaled units. The report is
+written next to the model as comparison.json.
+"""
+import argparse
+import json
+import os
+
+import joblib
+import numpy as np
+
+from global_model import GlobalModel, build_model, pad_windows
+from inference import get_engine
+from model_registry import ModelRegistry
+from utils import get_tickers, get_window, parse_data_from_file
+
+SPLIT_TRAIN = 0.8
+SPLIT_VALID = 0.9
+
+
+def load_series(base_dir, tickers):
+    """Scaled series of every ticker with a CSV and a scaler, same scaling as ModelRegistry"""
+    registry = ModelRegistry(base_dir=base_dir)
+    series = {}
+    for stock in tickers:
+        paths = registry.paths(stock)
+        if not (os.path.exists(paths["csv"]) and os.path.exists(paths["scaler"])):
+            print(f"Skipping {stock}: missing CSV or scaler")
+            continue
+        _, values = parse_data_from_file(paths["csv"])
+        scaler = joblib.load(paths["scaler"])
+        series[stock] = scaler.fit_transform(values.reshape(-1, 1)).flatten().astype(np.float32)
+    return series
+
+
+def split_bounds(length):
+    return int(length * SPLIT_TRAIN), int(length * SPLIT_VALID)
+
+
+def padded_examples(series, window_size, max_window, start, end):
+    """
+    Windows whose target lies in series[start:end], left-padded to max_window
+
+    Returns:
+    tuple: values, mask and targets
+    """
+    start = max(start, window_size)
+    if end <= start:
+        empty = np.empty((0, max_window), dtype=np.float32)
+        return empty, empty, np.empty(0, dtype=np.float32)
+
+    windows = np.lib.stride_tricks.sliding_window_view(series[start - window_size:end - 1], window_size)
+    values, mask = pad_windows(windows, max_window)
+    return values, mask, series[start:end]
+
+
+def dataset(series, tickers, windows, max_window, part, batch_size, shuffle=True):
+    """tf.data pipeline of the train or valid windows of every ticker"""
+    import tensorflow as tf
+
+    parts = []
+    for ticker_id, stock in enumerate(tickers):
+        train_end, valid_end = split_bounds(len(series[stock]))
+        start, end = (0, train_end) if part == "train" else (train_end, valid_end)
+        values, mask, targets = padded_examples(series[stock], windows[stock], max_window, start, end)
+        parts.append((values, mask, np.full(len(targets), ticker_id, dtype=np.int32), targets))
+
+    values, mask, ticker_ids, targets = (np.concatenate(arrays) for arrays in zip(*parts))
+    data = tf.data.Dataset.from_tensor_slices(((values, mask, ticker_ids[:, np.newaxis]), targets))
+    if shuffle:
+        data = data.shuffle(len(targets), seed=0)
+    return data.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+
+def train(series, epochs=100, batch_size=64, embedding_dim=8, patience=10):
+    """
+    Train the global model on every ticker of series
+
+    Returns:
+    GlobalModel: Trained model and its ticker vocabulary
+    """
+    import tensorflow as tf
+
+    tickers = sorted(series)
+    windows = {stock: get_window(stock) for stock in tickers}
+    max_window = max(windows.values())
+
+    model = build_model(len(tickers), max_window, embedding_dim=embedding_dim)
+    model.compile(loss="huber", optimizer="adam", metrics=["mae", "mse"])
+
+    train_data = dataset(series, tickers, windows, max_window, "train", batch_size)
+    valid_data = dataset(series, tickers, windows, max_window, "valid", batch_size, shuffle=False)
+    early_stopping = tf.keras.callbacks.EarlyStopping(patience=patience, restore_best_weights=True)
+    model.fit(train_data, validation_data=valid_data, epochs=epochs, callbacks=[early_stopping])
+
+    return GlobalModel(model, tickers, windows)
+
+
+def _errors(engine, series, window_size, start):
+    """One-step and rollout errors of an engine on series[start:]"""
+    test = series[start:]
+    windows = np.lib.stride_tricks.sliding_window_view(series[start - window_size:-1], window_size)
+    one_step, _ = engine.rollout(windows, 1)
+    one_step = one_step[:, 0] - test
+    rollout = engine.forecast(series[:start], window_size, len(test)) - test
+    return {
+        "mae": float(np.mean(np.abs(one_step))),
+        "rmse": float(np.sqrt(np.mean(one_step ** 2))),
+        "rollout_mae": float(np.mean(np.abs(rollout))),
+    }
+
+
+def compare(global_model, series, base_dir="."):
+    """
+    Evaluate the global model and the per-ticker models on each ticker's test split
+
+    Returns:
+    dict: Per-ticker errors of both models and their means
+    """
+    registry = ModelRegistry(base_dir=base_dir)
+    report = {"tickers": {}}
+
+    for stock in global_model.tickers:
+        if stock not in series:
+            continue
+        window_size = global_model.windows[stock]
+        _, start = split_bounds(len(series[stock]))
+        row = {"test_weeks": len(series[stock]) - start,
+               "global": _errors(global_model.ticker(stock), series[stock], window_size, start)}
+        try:
+            entry = registry.get(stock)
+            row["per_ticker"] = _errors(get_engine(entry.model), series[stock], window_size, start)
+        except OSError as e:
+            print(f"{stock}: no per-ticker model to compare with ({e})")
+        report["tickers"][stock] = row
+
+    for name in ("global", "per_ticker"):
+        rows = [row[name] for row in report["tickers"].values() if name in row]
+        if rows:
+            report[name] = {key: float(np.mean([r[key] for r in rows])) for key in rows[0]}
+    return report
+
+
+def print_report(report):
+    print(f"{'ticker':<10} {'global mae':>11} {'ticker mae':>11} {'global roll':>12} {'ticker roll':>12}")
+    for stock, row in report["tickers"].items():
+        per_ticker = row.get("per_ticker", {})
+        print(f"{stock:<10} {row['global']['mae']:>11.4f} {per_ticker.get('mae', float('nan')):>11.4f} "
+              f"{row['global']['rollout_mae']:>12.4f} {per_ticker.get('rollout_mae', float('nan')):>12.4f}")
+    for name in ("global", "per_ticker"):
+        if name in report:
+            print(f"mean {name}: {report[name]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the global multi-ticker model")
+    parser.add_argument("--tickers", nargs="*", help="Tickers to train on, all by default")
+    parser.add_argument("--base-dir", default=".", help="Directory containing models/, scalers/ and csv/")
+    parser.add_argument("--output", default=os.path.join("models", "global"), help="Directory of the global model")
+    parser.add_argument("--epochs", type=int, default=100, help="Maximum number of epochs")
+    parser.add_argument("--batch-size", type=int, default=64, help="Windows per training batch")
+    parser.add_argument("--embedding-dim", type=int, default=8, help="Size of the ticker embedding")
+    parser.add_argument("--compare-only", action="store_true", help="Only evaluate the model in --output")
+    args = parser.parse_args()
+
+    series = load_series(args.base_dir, args.tickers or get_tickers())
+    output = os.path.join(args.base_dir, args.output)
+
+    if args.compare_only:
+        global_model = GlobalModel.load(output)
+    else:
+        global_model = train(series, epochs=args.epochs, batch_size=args.batch_size,
+                             embedding_dim=args.embedding_dim)
+        global_model.save(output)
+        print(f"Global model of {len(global_model.tickers)} tickers written to {output}")
+
+    report = compare(global_model, series, args.base_dir)
+    print_report(report)
+    with open(os.path.join(output, "comparison.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
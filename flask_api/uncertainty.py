@@ -0,0 +1,86 @@
+import threading
+import weakref
+
+import numpy as np
+
+from inference import get_engine
+
+PERCENTILES = (5, 50, 95)
+MAX_PATHS = 1000
+
+_residuals = weakref.WeakKeyDictionary()
+_residuals_lock = threading.Lock()
+
+
+def residuals(model, series, window_size):
+    """
+    One-step-ahead errors of a model on its own series
+
+    Every window of the series is predicted in one batched call, a
+    single-step rollout, so this costs about one forward pass.
+
+    Returns:
+    np.ndarray: series[t] - prediction from series[t - window_size:t], scaled units
+    """
+    series = np.asarray(series, dtype=np.float32)
+    if len(series) <= window_size:
+        raise ValueError(f"Series of {len(series)} values is too short for a window of {window_size}")
+
+    windows = np.lib.stride_tricks.sliding_window_view(series[:-1], window_size)
+    predictions, _ = get_engine(model).rollout(windows, 1)
+    return series[window_size:] - predictions[:, 0]
+
+
+def get_residuals(entry, window_size):
+    """Get the residuals of a registry entry, computed once per loaded entry"""
+    with _residuals_lock:
+        cached = _residuals.get(entry)
+    if cached is None or cached[0] != window_size:
+        cached = (window_size, residuals(entry.model, entry.series, window_size))
+        with _residuals_lock:
+            _residuals[entry] = cached
+    return cached[1]
+
+
+def monte_carlo_forecast(model, series, window_size, n_steps, errors, n_paths=200, seed=0):
+    """
+    Roll out n_paths perturbed forecasts as one batch
+
+    Every step of every path adds a residual drawn with replacement from
+    errors before the value is fed back, so the paths spread the way the
+    model's own one-step errors compound.
+
+    Parameters:
+    errors (np.ndarray): Residuals to bootstrap, see residuals
+    n_paths (int): Number of Monte Carlo paths
+    seed (int): Seed of the bootstrap, equal seeds give equal paths
+
+    Returns:
+    np.ndarray: Paths of shape (n_paths, n_steps), scaled units
+    """
+    if not 1 <= n_paths <= MAX_PATHS:
+        raise ValueError(f"paths must be between 1 and {MAX_PATHS}")
+
+    rng = np.random.default_rng(seed)
+    noise = rng.choice(np.asarray(errors, dtype=np.float32), size=(n_paths, n_steps))
+    windows = np.repeat(np.asarray(series, dtype=np.float32)[np.newaxis, -window_size:], n_paths, axis=0)
+    paths, _ = get_engine(model).rollout(windows, n_steps, noise=noise)
+    return paths
+
+
+def percentile_bands(paths, percentiles=PERCENTILES):
+    """
+    Percentiles of every week over the paths
+
+    Returns:
+    dict: 'p<percentile>' -> array of n_steps values
+    """
+    values = np.percentile(paths, percentiles, axis=0)
+    return {f"p{p}": band for p, band in zip(percentiles, values)}
+
+
+def percentage_change_bands(paths, percentiles=PERCENTILES):
+    """Percentiles of the percentage change between the first and last week of every path"""
+    paths = np.asarray(paths, dtype=np.float64)
+    changes = (paths[:, -1] / paths[:, 0] - 1) * 100
+    return {f"p{p}": round(float(value), 2) for p, value in zip(percentiles, np.percentile(changes, percentiles))}
@@ -1,28 +1,87 @@
-import tensorflow as tf
 import numpy as np
-import pandas as pd
-from google.cloud import storage
-import joblib
+import os
+
+from inference import architecture_key, get_engine, get_group_engine
+from price_store import get_store
 
 def extended_forecast(model, series, window_size, forecast_steps):
     """
     Generates a forecast using your trained model up to a specified number of future steps.
     """
-    # Initialize forecast results with the original series to begin prediction
-    # forecast = list(series[-window_size:])  # Start from the last known window
-    #
-    # for _ in range(forecast_steps):
-    #     # Convert forecast list to tensor
-    #     input_series = np.array(forecast[-window_size:]).reshape(1, -1)  # Shape (1, window_size)
-    #
-    #     # Predict the next step
-    #     next_step = model.predict(input_series)[0][0]  # Get the predicted value
-    #
-    #     # Append the next step to the forecast
-    #     forecast.append(next_step)
-    #
-    # # Return only the future forecasted steps
-    # return np.array(forecast[-forecast_steps:])
+    # The whole recursive rollout runs in one compiled graph, see inference.RolloutEngine
+    WEEKS_IN_YEARS = 52 * forecast_steps
+
+    return get_engine(model).forecast(series, window_size, WEEKS_IN_YEARS)
+
+def extended_forecast_chunks(model, series, window_size, forecast_steps, chunk_size=52):
+    """
+    Generates the same forecast as extended_forecast, chunk_size weeks at a time.
+
+    Only the current window and one chunk are kept, so memory does not grow with the horizon.
+
+    :return: Generator of forecasted values, one array of at most chunk_size values per chunk
+    """
+    engine = get_engine(model)
+    window = np.asarray(series, dtype=np.float32)[np.newaxis, -window_size:]
+    remaining = 52 * forecast_steps
+
+    while remaining > 0:
+        n_steps = min(chunk_size, remaining)
+        # The final window of one chunk is the first window of the next
+        predictions, window = engine.rollout(window, n_steps)
+        remaining -= n_steps
+        yield predictions[0]
+
+def extended_forecast_batch(forecasts):
+    """
+    Generates forecasts of several models at once.
+
+    :param forecasts: List of (model, series, window_size, forecast_steps) tuples
+    :return: List of forecasted values, in the same order as forecasts
+    """
+    # Models sharing an architecture and window size are stepped together in one rollout,
+    # tickers of one global model (global_model.GlobalTicker) whatever their window size
+    groups = {}
+    for index, (model, series, window_size, forecast_steps) in enumerate(forecasts):
+        group = getattr(model, "group", None)
+        key = ("global", id(group)) if group is not None else (window_size, architecture_key(model))
+        groups.setdefault(key, {}).setdefault(id(model), []).append(index)
+
+    results = [None] * len(forecasts)
+    for members in groups.values():
+        # Requests for the same model share one row, rolled out to the longest horizon
+        rows = list(members.values())
+        models = [forecasts[indexes[0]][0] for indexes in rows]
+        windows = [
+            np.asarray(forecasts[indexes[0]][1])[-forecasts[indexes[0]][2]:] for indexes in rows
+        ]
+        n_steps = max(52 * forecasts[index][3] for indexes in rows for index in indexes)
+
+        if len(models) == 1:
+            predictions, _ = get_engine(models[0]).rollout(np.stack(windows), n_steps)
+        elif getattr(models[0], "group", None) is not None:
+            predictions = models[0].group.rollout_tickers([model.stock for model in models], windows, n_steps)
+        else:
+            try:
+                engine = get_group_engine(models, len(windows[0]))
+            except ValueError:
+                # Layers the stacked engine does not implement, each model rolls out on its own
+                predictions = np.concatenate(
+                    [get_engine(model).rollout(window[np.newaxis], n_steps)[0] for model, window in zip(models, windows)]
+                )
+            else:
+                predictions = engine.rollout(models, np.stack(windows), n_steps)
+
+        for row, indexes in enumerate(rows):
+            for index in indexes:
+                results[index] = predictions[row, :52 * forecasts[index][3]]
+
+    return results
+
+def extended_forecast_eager(model, series, window_size, forecast_steps):
+    """
+    Reference implementation of extended_forecast calling model.predict once per week.
+    """
     WEEKS_IN_YEARS = 52 * forecast_steps
     future_forecast = []
     last_window = series[-window_size:]
@@ -35,7 +94,29 @@ def extended_forecast(model, series, window_size, forecast_steps):
 
     return np.array(future_forecast)
 
-def parse_data_from_file(filename):
+def parse_data_from_file(filename, store=None):
+  """
+  Read the dates and adjusted closes of a CSV downloaded with yfinance.
+
+  The CSV is only parsed when it changed since it was last copied into the
+  weekly price store, otherwise the series is read from the store's
+  memory-mapped files.
+  """
+  store = store or get_store("weekly")
+  ticker = os.path.basename(os.path.dirname(os.path.abspath(filename)))
+  mtime = os.path.getmtime(filename)
+
+  meta = store.meta(ticker)
+  if meta is None or meta.get("source_mtime") != mtime:
+    store.replace(ticker, read_price_csv(filename), source_mtime=mtime)
+
+  dates, values = store.read(ticker)
+
+  return dates, values[:, store.columns.index('Adj Close')]
+
+def read_price_csv(filename):
+  import pandas as pd
+
   # Load the file, skipping the first three rows to remove unnecessary headers
   data = pd.read_csv(filename, skiprows=[1,2])
 
@@ -48,19 +129,14 @@ def parse_data_from_file(filename):
   # Set 'Date' as the index
   data.set_index('Date', inplace=True)
 
-  # Select only the 'Adj Close' column for forecasting
-  data = data[['Adj Close']]
-
-  data.head()
-
-  dates = data.index.tolist()
-  adj_closes = data['Adj Close'].tolist()
-
-  return np.array(dates), np.array(adj_closes)
+  return data
 
 def load_model_from_gcs(bucket_name, model_path, local_model_path):
-    # Initialize GCS client
-    client = storage.Client.from_service_account_json("credential.json")
+    import tensorflow as tf
+    from artifact_sync import gcs_client
+
+    # Shared GCS client, created once per process
+    client = gcs_client("credential.json")
 
     # Get the bucket
     bucket = client.bucket(bucket_name)
@@ -83,8 +159,11 @@ def load_scaler_from_gcs(bucket_name, scaler_path, local_scaler_path):
     :param local_model_path: Path to save the model locally
     :return: Loaded model object
     """
-    # Initialize GCS client
-    client = storage.Client.from_service_account_json("credential.json")
+    import joblib
+    from artifact_sync import gcs_client
+
+    # Shared GCS client, created once per process
+    client = gcs_client("credential.json")
 
     # Get the bucket
     bucket = client.bucket(bucket_name)
@@ -110,8 +189,10 @@ def load_csv_from_gcs(bucket_name, csv_path, local_csv_path):
     :param local_model_path: Path to save the model locally
     :return: Loaded model object
     """
-    # Initialize GCS client
-    client = storage.Client.from_service_account_json("credential.json")
+    from artifact_sync import gcs_client
+
+    # Shared GCS client, created once per process
+    client = gcs_client("credential.json")
 
     # Get the bucket
     bucket = client.bucket(bucket_name)
@@ -129,8 +210,12 @@ def load_csv_from_gcs(bucket_name, csv_path, local_csv_path):
     # return scaler
 
 def load_from_gcs(bucket_name, paths={}):
-    # Initialize GCS client
-    client = storage.Client.from_service_account_json("credential.json")
+    import joblib
+    import tensorflow as tf
+    from artifact_sync import gcs_client
+
+    # Shared GCS client, created once per process
+    client = gcs_client("credential.json")
 
     # Get the bucket
     bucket = client.bucket(bucket_name)
@@ -161,28 +246,31 @@ def load_from_gcs(bucket_name, paths={}):
 
     return model, scaler
 
-def get_window(stock: str) -> int:
-    windows = {
-        "^GSPC": 104,
-        "ADRO.JK": 72,
-        "ANTM.JK": 52,
-        "ASII.JK": 60,
-        "BBCA.JK": 36,
-        "BBNI.JK": 52,
-        "BBRI.JK": 30,
-        "BMRI.JK": 30,
-        "CTRA.JK": 30,
-        "GC=F": 52,
-        "GGRM.JK": 30,
-        "IDR=X": 4,
-        "INDF.JK": 52,
-        "INDY.JK": 52,
-        "LPKR.JK": 52,
-        "MYOR.JK": 52,
-        "PWON.JK": 52,
-        "UNVR.JK": 52
-    }
+WINDOWS = {
+    "^GSPC": 104,
+    "ADRO.JK": 72,
+    "ANTM.JK": 52,
+    "ASII.JK": 60,
+    "BBCA.JK": 36,
+    "BBNI.JK": 52,
+    "BBRI.JK": 30,
+    "BMRI.JK": 30,
+    "CTRA.JK": 30,
+    "GC=F": 52,
+    "GGRM.JK": 30,
+    "IDR=X": 4,
+    "INDF.JK": 52,
+    "INDY.JK": 52,
+    "LPKR.JK": 52,
+    "MYOR.JK": 52,
+    "PWON.JK": 52,
+    "UNVR.JK": 52
+}
 
+def get_window(stock: str) -> int:
     stock = stock.upper()
 
-    return windows.get(stock)
+    return WINDOWS.get(stock)
+
+def get_tickers() -> list:
+    return list(WINDOWS)